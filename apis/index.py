@@ -2,13 +2,39 @@ from fastapi import APIRouter, Depends, Request
 from typing import Dict, Any, Optional
 import logging
 
+from utils.codec_pool import codec_pool, get_codec_pool_stats
+from utils.ea3 import close_ea3_session, get_ea3_cache_stats
+from middleware.eacnet import get_eacnet_decode_stats
 from .p2d.index import router as p2d_router
+from ..services.p2d.log_writer import close_log_writers, get_log_writer_stats
+from ..services.p2d.user import get_pdata_cache_stats
 from ..utils.context import ILaochanContext, create_laochan_context
 
 router = APIRouter(prefix='/api', tags=['api'])
 
 router.include_router(p2d_router)
 
+async def shutdown():
+    """Write out buffered logs and release shared resources before the process exits."""
+    # logs first, they are the only state that isn't in the database yet
+    await close_log_writers()
+    await close_ea3_session()
+    codec_pool.shutdown()
+
+# carried over to the app by include_router
+router.add_event_handler('shutdown', shutdown)
+
+@router.get('/stats')
+async def get_stats():
+    """Counters of the shared caches, log writers and codec pool of this process"""
+    return {
+        "ea3Cache": get_ea3_cache_stats(),
+        "eacnetCodec": get_eacnet_decode_stats(),
+        "pdataCache": get_pdata_cache_stats(),
+        "logWriters": get_log_writer_stats(),
+        "codecPool": get_codec_pool_stats(),
+    }
+
 def get_routes():
     return router
 
@@ -1,26 +1,31 @@
+import asyncio
+import base64
 import logging
 from typing import Optional, Dict, Any, List
 from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
-from pymongo.database import Database
+from pymongo.asynchronous.database import AsyncDatabase
 
-from ...services.p2d.user import UserService
-from ...types.p2d.index import PlayerCustomizeSetting, PlayerRivalData
+from ...services.p2d.user import UserService, play_log_cursor
+from ...types.p2d.index import PlayerCustomizeSetting, PlayerPlayLog, PlayerRivalData
 from ...types.p2d.api import RivalPatch, RivalPostOrDelete
 from ...database import init_mongo_db
 
 logger = logging.getLogger('p2d-api')
 router = APIRouter(prefix='/p2d', tags=['p2d'])
 
-_db_instance = None
+_db_init: Optional[asyncio.Future] = None
 
-async def get_database() -> Database:
-    global _db_instance
-    if _db_instance is None:
-        _db_instance = await init_mongo_db()
-    return _db_instance
+async def get_database() -> AsyncDatabase:
+    global _db_init
+    # one shared init (it may run the migrations), concurrent first requests all
+    # wait on it; a failed init is started again by the next request
+    if _db_init is None or (_db_init.done() and (_db_init.cancelled() or _db_init.exception() is not None)):
+        _db_init = asyncio.ensure_future(init_mongo_db())
+    # shielded so a client hanging up doesn't cancel the init for everyone else
+    return await asyncio.shield(_db_init)
 
-async def get_user_service(db: Database = Depends(get_database)) -> UserService:
+async def get_user_service(db: AsyncDatabase = Depends(get_database)) -> UserService:
     return UserService(db)
 
 @router.get('/bot/player/{infinitas_id}')
@@ -72,21 +77,40 @@ async def get_customize(
     
     return {"customize": customize}
 
+def play_log_json(play_log: PlayerPlayLog) -> Dict[str, Any]:
+    """A play log as plain JSON: the ObjectId as its hex string and the ghost as base64."""
+    result = dict(play_log)
+    result["_id"] = str(result["_id"])
+    if result.get("ghost") is not None:
+        result["ghost"] = base64.b64encode(result["ghost"]).decode()
+    return result
+
 @router.get('/playlog/{token}')
 async def get_playlog(
     token: str,
-    skip: Optional[int] = Query(None),
-    limit: Optional[int] = Query(None),
+    skip: Optional[int] = Query(None, ge=0),
+    # 0 would mean "no limit" to mongo and defeat keyset paging
+    limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = Query(None),
+    ghost: bool = Query(False),
     user_service: UserService = Depends(get_user_service)
 ):
-    """Get play logs by token with pagination"""
-    result = user_service.get_play_logs(
-        token, 
-        skip if skip is not None else 0,
-        limit if limit is not None else 10
-    )
+    """Get play logs by token with pagination, pass back next as after for the following page"""
+    try:
+        result = await user_service.get_play_logs(
+            token, 
+            skip if skip is not None else 0,
+            limit,
+            after=after,
+            with_ghost=ghost
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {"playLogs": result}
+    return {
+        "playLogs": [play_log_json(play_log) for play_log in result],
+        "next": play_log_cursor(result[-1]) if result and len(result) == limit else None
+    }
 
 @router.get('/rival/{token}')
 async def get_rival(
@@ -103,22 +127,12 @@ async def get_rival(
             "dpRivals": []
         }
     
-    async def get_rival_player(tk: str) -> Dict[str, Any]:
-        pdata = await user_service.get_pdata_decoded(tk)
-        return pdata["player"] if pdata else None
-    
-    sp_rivals = []
-    dp_rivals = []
-    
-    for sp_token in result.get('sp', []):
-        rival_player = await get_rival_player(sp_token)
-        if rival_player:
-            sp_rivals.append(rival_player)
-    
-    for dp_token in result.get('dp', []):
-        rival_player = await get_rival_player(dp_token)
-        if rival_player:
-            dp_rivals.append(rival_player)
+    sp_tokens = result.get('sp', [])
+    dp_tokens = result.get('dp', [])
+    players = await user_service.get_rival_players(sp_tokens + dp_tokens)
+
+    sp_rivals = [players[tk] for tk in sp_tokens if tk in players]
+    dp_rivals = [players[tk] for tk in dp_tokens if tk in players]
     
     return {
         "enabled": True,
@@ -0,0 +1,65 @@
+# python -m bench [--json out.json] [--baseline old.json]
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+from .codec import run_payload
+from .corpus import load_corpus
+
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """
+    Report every stage whose p50 got slower than the baseline by more than tolerance.
+    """
+    previous = {(r['payload'], r['stage'], r['path']): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get((result['payload'], result['stage'], result['path']))
+        if old and result['p50_us'] > old['p50_us'] * (1 + tolerance):
+            regressions.append(
+                f"{result['payload']}/{result['stage']}/{result['path']}: "
+                f"p50 {old['p50_us']:.1f}us -> {result['p50_us']:.1f}us"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='eacnet codec micro-benchmarks')
+    parser.add_argument('--payload', action='append', help='only run these payload sets')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds spent per stage')
+    parser.add_argument('--max-ops', type=int, default=100000)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='fail when slower than the results in this file')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    results: List[Dict[str, Any]] = []
+
+    print(f'{"payload":<14} {"stage":<12} {"path":<8} {"ops/s":>10} {"p50 us":>10} {"p99 us":>10} {"peak alloc":>11}')
+    for name, documents in corpus.items():
+        if args.payload and name not in args.payload:
+            continue
+        for r in run_payload(name, documents, args.min_time, args.max_ops):
+            results.append(r)
+            print(
+                f'{r["payload"]:<14} {r["stage"]:<12} {r["path"]:<8} {r["ops_per_sec"]:10.1f} '
+                f'{r["p50_us"]:10.1f} {r["p99_us"]:10.1f} {r["peak_alloc"]:11d}'
+            )
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from utils import lz77
+from utils.kbin import decode_kbin
+from utils.kbinxml import toObject
+from utils.lz77 import Lz77
+from middleware.eacnet import decode_base64
+
+from .corpus import to_request_body
+
+LZ77 = Lz77()
+
+
+def stage_base64(body: str) -> bytes:
+    # the base64 step of middleware.eacnet.decode_request, minus its size check
+    return decode_base64(body.encode('ascii'))
+
+
+def stage_lz77(buffer: bytes) -> bytes:
+    return LZ77.decompress(buffer)
+
+
+def stage_kbin_raw(decoded: bytes) -> Dict[str, Any]:
+    return decode_kbin(decoded)
+
+
+def stage_kbin_object(decoded: bytes) -> Dict[str, Any]:
+    return decode_kbin(decoded, True)
+
+
+def stage_to_object(raw: Dict[str, Any]) -> Any:
+    return toObject(raw)
+
+
+def measure(func: Callable[[Any], Any], inputs: List[Any], min_time: float, max_ops: int) -> Dict[str, float]:
+    """
+    Time func over inputs round-robin until min_time has passed, then measure the
+    peak traced allocation of a single call separately so tracing doesn't skew timing.
+    """
+    samples: List[int] = []
+    started = time.perf_counter()
+    i = 0
+    while len(samples) < max_ops and (time.perf_counter() - started < min_time or len(samples) < 5):
+        arg = inputs[i % len(inputs)]
+        t0 = time.perf_counter_ns()
+        func(arg)
+        samples.append(time.perf_counter_ns() - t0)
+        i += 1
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func(inputs[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    return {
+        'ops': len(samples),
+        'ops_per_sec': len(samples) / (sum(samples) / 1e9),
+        'p50_us': samples[len(samples) // 2] / 1e3,
+        'p99_us': samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1e3,
+        'peak_alloc': peak,
+    }
+
+
+def available_paths() -> Dict[str, Optional[object]]:
+    """
+    LZ77 implementations that can be benchmarked here, keyed by name.
+    """
+    paths: Dict[str, Optional[object]] = {'python': None}
+    if lz77.clib is not None:
+        paths['lz77cpp'] = lz77.clib
+    return paths
+
+
+def run_payload(name: str, documents: List[bytes], min_time: float, max_ops: int) -> List[Dict[str, Any]]:
+    """
+    Run every pipeline stage for one payload set, once per LZ77 path.
+    """
+    bodies = [to_request_body(doc) for doc in documents]
+    buffers = [stage_base64(body) for body in bodies]
+    raws = [stage_kbin_raw(doc) for doc in documents]
+
+    stages = [
+        ('base64', stage_base64, bodies),
+        ('lz77', stage_lz77, buffers),
+        ('kbin_raw', stage_kbin_raw, documents),
+        ('kbin_object', stage_kbin_object, documents),
+        ('to_object', stage_to_object, raws),
+    ]
+
+    original = lz77.clib
+    results = []
+    try:
+        for path, clib in available_paths().items():
+            lz77.clib = clib
+            for stage, func, inputs in stages:
+                result = measure(func, inputs, min_time, max_ops)
+                result.update({'payload': name, 'stage': stage, 'path': path})
+                results.append(result)
+    finally:
+        lz77.clib = original
+    return results
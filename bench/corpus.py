@@ -0,0 +1,121 @@
+import base64
+import random
+from typing import Dict, List
+
+from utils.kbin import encode_kbin
+from utils.kxml_value import v
+from utils.lz77 import Lz77
+
+
+def small_call(seed: int = 0) -> bytes:
+    # a typical eacnet call, e.g. pc.common with a handful of values
+    rnd = random.Random(seed)
+    return encode_kbin('eacnet', {
+        'info': {
+            'token': v.str('%032x' % rnd.getrandbits(128)),
+            'game_id': v.str('p2d'),
+        },
+        'request': {
+            'module': v.str('system'),
+            'method': v.str('getmaster'),
+            'data': {
+                'datatype': v.str('S_SRANKER'),
+                'datakey': v.str('%d' % rnd.randint(0, 99)),
+                'clock': v.u64(rnd.randint(1600000000, 1700000000)),
+            },
+        },
+    })
+
+
+def _history(rnd: random.Random, entries: int) -> Dict[str, object]:
+    return {
+        f'd{i}': {'time': v.u64(1600000000 + i * 86400), 'val': v.s32(rnd.randint(0, 5000))}
+        for i in range(entries)
+    }
+
+
+def pdata_upload(seed: int = 0, history: int = 60) -> bytes:
+    # full pdata save, shaped after types/p2d/pdata.py
+    rnd = random.Random(seed)
+    option = {name: v.s32(rnd.randint(0, 10)) for name in (
+        'hispeed_sp', 'hispeed_dp', 'sudden_sp', 'sudden_dp', 'lift_sp', 'lift_dp',
+        'random_sp', 'random_dp', 'gauge_sp', 'gauge_dp', 'judge_adjust_sp', 'judge_adjust_dp',
+        'ghost_type_sp', 'ghost_type_dp', 'graph_no_sp', 'graph_no_dp', 'pacemaker_sp', 'pacemaker_dp',
+    )}
+    option['disp_judge_sp'] = v.bool(True)
+    option['disp_judge_dp'] = v.bool(False)
+    option['key_config'] = {f'sw_{i}': v.s32(i) for i in range(36)}
+
+    def play_style():
+        return {
+            'djpoint_hist': _history(rnd, history),
+            'grade_hist': _history(rnd, history),
+            'mrank_hist': _history(rnd, history),
+            'play_time': {
+                'hist': _history(rnd, history),
+                'last_end': v.u64(1700000000),
+                'last_start': v.u64(1699990000),
+                'max': v.s32(rnd.randint(0, 9999)),
+                'total': v.s32(rnd.randint(0, 999999)),
+            },
+        }
+
+    def side():
+        return {
+            'ctrl_count': v.s32(rnd.randint(0, 9999)),
+            'ctrl_type': v.s32(0),
+            'ctrl_hit': {**{f'sw_{i:02d}': v.s32(rnd.randint(0, 99999)) for i in range(1, 12)}, 'tt_mv': v.s32(0)},
+        }
+
+    return encode_kbin('pdata', {
+        'bit': {'boost_expire_date': v.u64(0), 'consume_bit': v.s32(100), 'total_bit': v.s32(15000)},
+        'effector': {name: v.s32(rnd.randint(0, 20)) for name in (
+            'effect_type', 'filter', 'hi_eq', 'hi_mid_eq', 'low_eq', 'low_mid_eq', 'play_volume', 'vefx',
+        )},
+        'option': option,
+        'player': {
+            'achievement_dp': v.s32(0),
+            'achievement_sp': v.s32(rnd.randint(0, 500)),
+            'djname': v.str('LAOCHAN'),
+            'grade_id_dp': v.s32(-1),
+            'grade_id_sp': v.s32(rnd.randint(0, 18)),
+            'infinitas_id': v.str('LCHAN%08X' % rnd.getrandbits(32)),
+            'play_num_dp': v.s32(rnd.randint(0, 999)),
+            'play_num_sp': v.s32(rnd.randint(0, 9999)),
+            'pref_id': v.s32(13),
+        },
+        'rival': {'challenge_crush_num_dp': v.s32(0), 'challenge_crush_num_sp': v.s32(3)},
+        'stats': {'sp': play_style(), 'dp': play_style(), 'left': side(), 'right': side()},
+    })
+
+
+def music_data_response(entries: int = 2000, seed: int = 0) -> bytes:
+    # music data shaped kbin, which is what most large responses look like
+    rnd = random.Random(seed)
+    musics = [{
+        '$music_id': str(1000 + i),
+        'play_style': v.s8(rnd.randint(0, 1)),
+        'score': v.s32([rnd.randint(0, 4000) for _ in range(5)]),
+        'clear_flag': v.s8([rnd.randint(0, 7) for _ in range(5)]),
+        'miss_count': v.s32([rnd.randint(-1, 200) for _ in range(5)]),
+        'best_score_clock': v.u64([rnd.randint(1600000000, 1700000000) for _ in range(5)]),
+    } for i in range(entries)]
+    return encode_kbin('response', {'music': musics})
+
+
+def to_request_body(document: bytes) -> str:
+    """
+    Compress and encode a kbin document the way cabinets send it in body.request.
+    """
+    return base64.urlsafe_b64encode(Lz77().compress(document)).decode('ascii').rstrip('=')
+
+
+def load_corpus() -> Dict[str, List[bytes]]:
+    """
+    Named payload sets of raw kbin documents.
+    """
+    return {
+        'small_call': [small_call(seed) for seed in range(16)],
+        'pdata_upload': [pdata_upload(seed) for seed in range(4)],
+        'music_data': [music_data_response(2000, seed) for seed in range(2)],
+    }
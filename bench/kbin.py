@@ -0,0 +1,73 @@
+# python -m bench.kbin [pdata.bin ...] [--mongo N]
+import argparse
+import timeit
+import xml.etree.ElementTree as ET
+from typing import List
+
+import kbinxml
+
+from utils.kbin import decode_kbin, encode_kbin
+from utils.kbinxml import serializeObject
+
+
+def load_mongo_blobs(limit: int) -> List[bytes]:
+    from pymongo import MongoClient
+    from utils.config import config
+
+    client = MongoClient(config.mongo_url)
+    col = client[config.db_name]['p2d_play_data']
+    return [bytes(doc['pdata']) for doc in col.find({}, projection={'pdata': 1}, limit=limit)]
+
+
+def legacy_decode(blob: bytes):
+    # text round-trip the old fromKBinXml paid for, before any toObject pass
+    return ET.fromstring(kbinxml.decode(blob))
+
+
+def legacy_encode(tree) -> bytes:
+    name, obj = next(iter(tree.items()))
+    return kbinxml.encode(f'<?xml version="1.0" encoding="UTF-8"?>{serializeObject(obj, name)}')
+
+
+def native_encode(tree) -> bytes:
+    name, obj = next(iter(tree.items()))
+    return encode_kbin(name, obj)
+
+
+def bench(name: str, func, blobs: List[bytes], number: int) -> float:
+    elapsed = timeit.timeit(lambda: [func(b) for b in blobs], number=number)
+    per_doc = elapsed / (number * len(blobs)) * 1e6
+    print(f'{name:<24} {per_doc:10.1f} us/doc')
+    return per_doc
+
+
+def main():
+    parser = argparse.ArgumentParser(description='kbin decode/encode benchmark over pdata blobs')
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--mongo', type=int, default=0, help='also load N blobs from p2d_play_data')
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    blobs = []
+    for path in args.files:
+        with open(path, 'rb') as f:
+            blobs.append(f.read())
+    if args.mongo:
+        blobs.extend(load_mongo_blobs(args.mongo))
+    if not blobs:
+        parser.error('no pdata blobs given')
+
+    print(f'{len(blobs)} blobs, {sum(len(b) for b in blobs) / len(blobs):.0f} bytes avg')
+    legacy = bench('kbinxml.decode + ET', legacy_decode, blobs, args.number)
+    raw = bench('decode_kbin raw', decode_kbin, blobs, args.number)
+    obj = bench('decode_kbin object', lambda b: decode_kbin(b, True), blobs, args.number)
+    print(f'speedup raw {legacy / raw:.1f}x, object {legacy / obj:.1f}x')
+
+    trees = [decode_kbin(b) for b in blobs]
+    legacy = bench('serializeObject + encode', legacy_encode, trees, args.number)
+    native = bench('encode_kbin', native_encode, trees, args.number)
+    print(f'speedup encode {legacy / native:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
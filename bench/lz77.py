@@ -0,0 +1,43 @@
+# python -m bench.lz77 [payload.bin ...] [--size N]
+import argparse
+import timeit
+from typing import List, Tuple
+
+from utils.lz77 import Lz77, Lz77Compress, clib
+
+from .corpus import music_data_response
+
+
+def bench(payloads: List[bytes], level: str, number: int) -> Tuple[float, float, float]:
+    lz = Lz77()
+    total = sum(len(p) for p in payloads)
+    compressed = [lz.compress(p, level) for p in payloads]
+    ratio = sum(len(c) for c in compressed) / total
+    comp = timeit.timeit(lambda: [lz.compress(p, level) for p in payloads], number=number)
+    decomp = timeit.timeit(lambda: [lz.decompress(c) for c in compressed], number=number)
+    return ratio, total * number / comp / 1e6, total * number / decomp / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='lz77 ratio and throughput per compression level')
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--size', type=int, default=2000, help='music entries in the synthetic payload')
+    parser.add_argument('--number', type=int, default=3)
+    args = parser.parse_args()
+
+    payloads = []
+    for path in args.files:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    if not payloads:
+        payloads.append(music_data_response(args.size))
+
+    print(f'{len(payloads)} payloads, {sum(len(p) for p in payloads)} bytes, lz77cpp {"on" if clib else "off"}')
+    print(f'{"level":<8} {"ratio":>7} {"comp MB/s":>10} {"decomp MB/s":>12}')
+    for level in Lz77Compress.LEVELS:
+        ratio, comp, decomp = bench(payloads, level, args.number)
+        print(f'{level:<8} {ratio:7.3f} {comp:10.2f} {decomp:12.2f}')
+
+
+if __name__ == '__main__':
+    main()
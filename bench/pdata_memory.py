@@ -0,0 +1,71 @@
+# python -m <package>.bench.pdata_memory [--players N], from the directory above the repo
+import argparse
+import gc
+import time
+import tracemalloc
+
+from utils.kbinxml import fromKBinXml
+
+from ..services.p2d.pdata_cache import deep_sizeof
+from ..services.p2d.pdata_typed import decode_pdata_typed
+from .corpus import pdata_upload
+
+
+def decode_raw(blob: bytes):
+    # what pdata_cache holds today
+    return fromKBinXml(blob)['pdata']
+
+
+def decode_object(blob: bytes):
+    return fromKBinXml(blob, to_object=True)['pdata']
+
+
+def fill_cache(decode, blobs):
+    """
+    Decode every blob into a dict the way PdataCache keeps them and return the
+    cache, the bytes it retains according to tracemalloc and the decode time.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    cache = {player: decode(blob) for player, blob in enumerate(blobs)}
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return cache, retained, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='memory of a pdata cache, dict trees vs slotted objects')
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--history', type=int, default=60, help='entries per history subtree')
+    args = parser.parse_args()
+
+    # a handful of distinct documents is enough, every decode allocates a fresh tree
+    documents = [pdata_upload(seed, args.history) for seed in range(8)]
+    blobs = [documents[i % len(documents)] for i in range(args.players)]
+
+    print(f'{args.players} players, {len(documents[0])} byte pdata')
+    print(f'{"form":<8} {"retained":>12} {"per player":>11} {"deep_sizeof":>12} {"decode us":>10} {"djname ns":>10}')
+    for form, decode, djname in (
+        ('raw', decode_raw, lambda p: p['player']['djname']['__value']),
+        ('object', decode_object, lambda p: p['player']['djname']),
+        # typed keeps its blob alive for the undecoded histories: retained leaves the
+        # shared blobs out, deep_sizeof counts them
+        ('typed', decode_pdata_typed, lambda p: p.player.djname),
+    ):
+        cache, retained, elapsed = fill_cache(decode, blobs)
+        start = time.perf_counter()
+        for pdata in cache.values():
+            djname(pdata)
+        lookup = time.perf_counter() - start
+        print(
+            f'{form:<8} {retained:>12} {retained // args.players:>11} {deep_sizeof(cache[0]):>12} '
+            f'{elapsed / args.players * 1e6:>10.1f} {lookup / args.players * 1e9:>10.1f}'
+        )
+        del cache
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# python -m bench.response [--number N]
+import argparse
+import timeit
+
+from middleware.eacnet import encode_response
+from utils.kbin import decode_kbin
+from utils.lz77 import Lz77
+
+from .corpus import music_data_response, pdata_upload, small_call
+
+EAMUSE_INFO = '1-5f2b7d3c-0a1b'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='eacnet response encoder, small to large responses')
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = {
+        'small_call': small_call(0),
+        'pdata': pdata_upload(0),
+        'music_data': music_data_response(2000, 0),
+    }
+
+    print(f'{"payload":<12} {"rc4":<4} {"kbin B":>8} {"wire B":>8} {"compress":>9} {"us/op":>10} {"client us":>10}')
+    for name, document in payloads.items():
+        (top_name, tree), = decode_kbin(document).items()
+        for info in (None, EAMUSE_INFO):
+            body, headers = encode_response(top_name, tree, info)
+            seconds = timeit.timeit(lambda: encode_response(top_name, tree, info), number=args.number)
+            # what the cabinet pays to read it back, decompression only
+            client = 0.0
+            if headers['X-Compress'] == 'lz77' and info is None:
+                client = timeit.timeit(lambda: Lz77().decompress(body), number=args.number)
+            print(
+                f'{name:<12} {"on" if info else "off":<4} {len(document):>8} {len(body):>8} '
+                f'{headers["X-Compress"]:>9} {seconds / args.number * 1e6:>10.1f} {client / args.number * 1e6:>10.1f}'
+            )
+
+
+if __name__ == '__main__':
+    main()
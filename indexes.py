@@ -0,0 +1,170 @@
+# python -m <package>.indexes [--ensure] [--check]
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, AsyncMongoClient, IndexModel
+from pymongo.asynchronous.database import AsyncDatabase
+from utils.config import config
+
+logger = logging.getLogger('database')
+
+# every index the p2d services rely on, per collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    'p2d_play_data': [
+        IndexModel([("infinitas_id", ASCENDING)], name='infinitas_id'),
+    ],
+    'p2d_play_log': [
+        # _id breaks ties between logs of the same clock for keyset paging
+        IndexModel([("player", ASCENDING), ("clock", DESCENDING), ("_id", DESCENDING)], name='player_clock_id'),
+    ],
+    'p2d_course_log': [
+        IndexModel([("player", ASCENDING), ("_id", DESCENDING)], name='player_id'),
+    ],
+    'p2d_music_data': [
+        # play_style before music_id so get_music_datas can use the prefix too
+        IndexModel([("player", ASCENDING), ("play_style", ASCENDING), ("music_id", ASCENDING)], name='player_style_music'),
+    ],
+}
+
+# (collection, filter, sort) for every query UserService issues, with sample values
+QUERY_SHAPES: List[Tuple[str, Dict[str, Any], Optional[Dict[str, int]]]] = [
+    ('p2d_play_data', {"_id": "player"}, None),
+    ('p2d_play_data', {"_id": {"$in": ["player", "rival"]}}, None),
+    ('p2d_play_data', {"infinitas_id": "C0000000000"}, None),
+    ('p2d_play_log', {"player": "player"}, {"player": 1, "clock": -1, "_id": -1}),
+    ('p2d_play_log', {"player": "player", "$or": [
+        {"clock": {"$lt": 0}},
+        {"clock": 0, "_id": {"$lt": ObjectId("000000000000000000000000")}},
+    ]}, {"player": 1, "clock": -1, "_id": -1}),
+    ('p2d_play_log', {"player": "player", "clock": 0}, None),
+    ('p2d_play_log_ghost', {"_id": {"$in": [ObjectId("000000000000000000000000")]}}, None),
+    ('p2d_course_log', {"player": "player"}, {"player": 1, "_id": -1}),
+    ('p2d_course_log', {"player": "player", "_id": {"$lt": ObjectId("000000000000000000000000")}}, {"player": 1, "_id": -1}),
+    ('p2d_music_data', {"player": "player", "play_style": 0}, None),
+    ('p2d_music_data', {"player": "player", "music_id": 1000, "play_style": 0}, None),
+    ('p2d_music_data', {"player": "player", "music_id": {"$in": [1000, 1001]}, "play_style": {"$in": [0, 1]}}, None),
+    ('p2d_customize_setting', {"_id": "player"}, None),
+    ('p2d_rival_data', {"_id": "player"}, None),
+]
+
+def key_of(index: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((field, direction) for field, direction in index["key"].items())
+
+async def diff_indexes(db: AsyncDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Compare the declared INDEXES with what the server has. Per collection, report
+    declared indexes that are missing, ones whose name exists with a different key,
+    and undeclared extras.
+    """
+    report = {}
+    for collection, declared in INDEXES.items():
+        existing = {}
+        async for index in await db[collection].list_indexes():
+            existing[index["name"]] = key_of(index)
+
+        wanted = {model.document["name"]: key_of(model.document) for model in declared}
+        existing_keys = set(existing.values())
+
+        report[collection] = {
+            "missing": [name for name, key in wanted.items() if name not in existing and key not in existing_keys],
+            "conflicting": [name for name, key in wanted.items() if name in existing and existing[name] != key],
+            "extra": [
+                name for name, key in existing.items()
+                if name != "_id_" and name not in wanted and key not in wanted.values()
+            ],
+        }
+    return report
+
+async def ensure_indexes(db: AsyncDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """Build every missing declared index and log any drift that needs a human."""
+    report = await diff_indexes(db)
+    for collection, drift in report.items():
+        missing = [m for m in INDEXES[collection] if m.document["name"] in drift["missing"]]
+        if missing:
+            logger.info('building indexes on %s: %s', collection, ', '.join(drift["missing"]))
+            await db[collection].create_indexes(missing)
+
+        if drift["conflicting"]:
+            logger.warning('indexes on %s differ from the registry: %s', collection, ', '.join(drift["conflicting"]))
+        if drift["extra"]:
+            logger.warning('undeclared indexes on %s: %s', collection, ', '.join(drift["extra"]))
+
+    return report
+
+_build_task: Optional[asyncio.Task] = None
+
+def ensure_indexes_in_background(db: AsyncDatabase) -> asyncio.Task:
+    """Start ensure_indexes without holding up startup; failures are logged, not raised."""
+    global _build_task
+
+    def done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error('index build failed: %s', task.exception())
+
+    _build_task = asyncio.ensure_future(ensure_indexes(db))
+    _build_task.add_done_callback(done)
+    return _build_task
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        stages.append(node.get("stage", ""))
+        if "inputStage" in node:
+            stack.append(node["inputStage"])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+async def check_coverage(db: AsyncDatabase) -> List[str]:
+    """
+    Explain every query in QUERY_SHAPES and return the ones that scan the whole
+    collection or sort in memory.
+    """
+    problems = []
+    for collection, query, sort in QUERY_SHAPES:
+        command: Dict[str, Any] = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = sort
+
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        plan = explain["queryPlanner"]["winningPlan"]
+        # servers using the slot based engine nest the classic plan one level down
+        stages = plan_stages(plan.get("queryPlan", plan))
+        if "COLLSCAN" in stages or "SORT" in stages:
+            problems.append(f'{collection} {query} sort={sort}: {" <- ".join(stages)}')
+
+    return problems
+
+async def main(args: argparse.Namespace) -> int:
+    client = AsyncMongoClient(config.mongo_url)
+    try:
+        db = client[config.db_name]
+        if args.ensure:
+            await ensure_indexes(db)
+
+        failed = False
+        for collection, drift in (await diff_indexes(db)).items():
+            for kind, names in drift.items():
+                if names:
+                    failed = failed or kind != "extra"
+                    print(f'{collection}: {kind} {", ".join(names)}')
+
+        if args.check:
+            for problem in await check_coverage(db):
+                failed = True
+                print(f'not index-covered: {problem}')
+
+        return 1 if failed else 0
+    finally:
+        await client.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='report and repair p2d index drift')
+    parser.add_argument('--ensure', action='store_true', help='build missing indexes first')
+    parser.add_argument('--check', action='store_true', help='explain every UserService query against the server')
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main(parser.parse_args())))
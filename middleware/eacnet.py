@@ -1,7 +1,230 @@
-from typing import Dict, Any, Optional
-import base64
+from typing import Dict, Any, Optional, Tuple, Union
+import binascii
+import time
 from utils.lz77 import Lz77
-from utils.kbinxml import fromKBinXml, toObject
+from utils.kbinxml import fromKBinXml, toKBinXml
+from utils.kxml_value import Serializable
+from utils.rc4 import rc4_transform
+from utils.codec_pool import codec_pool, estimate_tree_size
+from utils.config import config
+
+LZ77 = Lz77()
+
+# the client sends urlsafe base64 with spaces standing in for '+', map all of it in one pass
+_B64_TABLE = bytes.maketrans(b' -_', b'++/')
+
+# per stage [calls, total seconds, max seconds]
+stage_stats: Dict[str, list] = {}
+
+class EacnetException(Exception):
+    pass
+
+def get_eacnet_decode_stats() -> Dict[str, Dict[str, float]]:
+    return {
+        stage: {
+            'calls': calls,
+            'avg_ms': total / calls * 1000 if calls else 0.0,
+            'max_ms': worst * 1000,
+        }
+        for stage, (calls, total, worst) in stage_stats.items()
+    }
+
+def _record(timings: Dict[str, float], stage: str, start: float) -> float:
+    now = time.perf_counter()
+    timings[stage] = now - start
+    return now
+
+def _collect(timings: Dict[str, float]):
+    # kept apart from _record so timings taken in a codec pool worker still count
+    for stage, elapsed in timings.items():
+        stats = stage_stats.setdefault(stage, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+def decode_base64(raw: bytes) -> bytes:
+    raw = raw.translate(_B64_TABLE)
+    try:
+        return binascii.a2b_base64(raw + b'=' * (-len(raw) % 4))
+    except binascii.Error as e:
+        raise EacnetException(f'malformed request body: {e}')
+
+def decode_request(request: Union[str, bytes]) -> Tuple[memoryview, Dict[str, float]]:
+    """
+    base64 -> lz77 of an eacnet request body. Sizes are checked before each stage
+    allocates, and the decompressed kbin is handed on as a view of the lz77 output.
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    raw = request.encode('ascii') if isinstance(request, str) else bytes(request)
+    # every 4 base64 chars carry 3 bytes
+    if len(raw) // 4 * 3 > config.eacnet_max_compressed_size:
+        raise EacnetException('request body exceeds the compressed size limit')
+
+    buffer = decode_base64(raw)
+    start = _record(timings, 'base64', start)
+
+    decoded = LZ77.decompress_view(buffer, config.eacnet_max_decompressed_size)
+    _record(timings, 'lz77', start)
+
+    return decoded, timings
+
+def decode_body(request: Union[str, bytes]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Dict[str, float]]:
+    """
+    Everything the middleware needs from a request body: the object tree, the typed
+    raw request data for relayed calls (None otherwise) and the stage timings. Only
+    plain picklable values come back, so it can run in the codec pool.
+    """
+    decoded, timings = decode_request(request)
+    start = time.perf_counter()
+    result = fromKBinXml(decoded, to_object=True)
+    _record(timings, 'kbin', start)
+
+    relay = None
+    if 'eacnet' in result:
+        request_node = result['eacnet']['request']
+        if request_node and 'service' in request_node:
+            # relay needs the typed raw tree, only decode it for relayed calls
+            relay = fromKBinXml(decoded)['eacnet']['request']['data']
+
+    return result, relay, timings
+
+class CompressionPlanner:
+    """
+    Picks how to compress a response of a given size: the best lz77 level whose
+    expected time fits the latency budget, or none at all. Expected time comes from
+    a moving average of the throughput each level actually achieved.
+    """
+
+    LEVELS = ("best", "fast")
+
+    def __init__(self, throughput: Optional[Dict[str, float]] = None):
+        # bytes per second of the pure python compressor, refined as responses go out
+        self.throughput: Dict[str, float] = dict(throughput) if throughput else {"best": 0.5e6, "fast": 2e6}
+
+    def choose(self, size: int) -> Optional[str]:
+        if size < config.eacnet_compress_min_size:
+            return None
+
+        budget = config.eacnet_compress_budget_ms / 1000
+        for level in self.LEVELS:
+            if size / self.throughput[level] <= budget:
+                return level
+        return None
+
+    def observe(self, level: str, size: int, seconds: float):
+        if seconds > 0:
+            self.throughput[level] = self.throughput[level] * 0.8 + size / seconds * 0.2
+
+planner = CompressionPlanner()
+
+def eamuse_key(eamuse_info: str) -> str:
+    # X-Eamuse-Info: 1-xxxxxxxx-xxxx, the two hex groups are the rc4 key half
+    parts = eamuse_info.strip().split('-')
+    if len(parts) != 3 or parts[0] != '1':
+        raise EacnetException(f'unsupported X-Eamuse-Info {eamuse_info!r}')
+    return parts[1] + parts[2]
+
+def encode_body(
+    top_name: str,
+    obj: Serializable,
+    eamuse_info: Optional[str],
+    encoding: str,
+    throughput: Dict[str, float]
+) -> Tuple[bytes, Dict[str, str], Dict[str, float], Optional[Tuple[str, int, float]]]:
+    """
+    kbin -> lz77 (when worth it) -> rc4 (when the request was encrypted) of a handler
+    result. Module level so the codec pool can run it in a worker: the compression
+    level is planned from the caller's throughput, and the stage timings and the
+    (level, size, seconds) compression sample are handed back for it to record.
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    data = toKBinXml(top_name, obj, encoding)
+    start = _record(timings, 'encode_kbin', start)
+
+    headers = {
+        'Content-Type': 'application/octet-stream',
+        'X-Compress': 'none',
+    }
+
+    observed = None
+    level = CompressionPlanner(throughput).choose(len(data))
+    if level:
+        compressed = LZ77.compress(data, level)
+        now = _record(timings, 'encode_lz77', start)
+        observed = (level, len(data), now - start)
+        start = now
+        if len(compressed) < len(data):
+            data = compressed
+            headers['X-Compress'] = 'lz77'
+
+    data = _encrypt(data, headers, eamuse_info, timings, start)
+    return data, headers, timings, observed
+
+def _finish_encode(
+    result: Tuple[bytes, Dict[str, str], Dict[str, float], Optional[Tuple[str, int, float]]]
+) -> Tuple[bytes, Dict[str, str]]:
+    data, headers, timings, observed = result
+    if observed is not None:
+        planner.observe(*observed)
+    _collect(timings)
+    return data, headers
+
+def encode_response(
+    top_name: str,
+    obj: Serializable,
+    eamuse_info: Optional[str] = None,
+    encoding: str = "UTF-8"
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Encode a handler result on the calling thread, plus the headers the client
+    needs to undo it.
+    """
+    return _finish_encode(encode_body(top_name, obj, eamuse_info, encoding, planner.throughput))
+
+async def encode_response_pooled(
+    top_name: str,
+    obj: Serializable,
+    eamuse_info: Optional[str] = None,
+    encoding: str = "UTF-8"
+) -> Tuple[bytes, Dict[str, str]]:
+    """encode_response, in the codec pool when the tree is large enough to stall the loop."""
+    size = estimate_tree_size(obj, codec_pool.threshold)
+    result = await codec_pool.run(size, encode_body, top_name, obj, eamuse_info, encoding, planner.throughput)
+    return _finish_encode(result)
+
+def _encrypt(
+    data: bytes,
+    headers: Dict[str, str],
+    eamuse_info: Optional[str],
+    timings: Dict[str, float],
+    start: float
+) -> bytes:
+    if eamuse_info:
+        data = rc4_transform(eamuse_key(eamuse_info), data)
+        _record(timings, 'encode_rc4', start)
+        headers['X-Eamuse-Info'] = eamuse_info
+    return data
+
+async def eacnet_response(ctx, next):
+    """
+    Runs after the handler: encode ctx.result, a single {top_name: tree} dict, once
+    into the response body and headers.
+    """
+    await next()
+
+    result = getattr(ctx, 'result', None)
+    if not result:
+        return
+
+    (top_name, obj), = result.items()
+    body, headers = await encode_response_pooled(top_name, obj, ctx.request.headers.get('X-Eamuse-Info'))
+
+    ctx.response.body = body
+    ctx.response.headers.update(headers)
 
 async def eacnet(ctx, next):
     body = ctx.request.body
@@ -14,12 +237,9 @@ async def eacnet(ctx, next):
     if not request:
         return await next()
     
-    modified_request = request.replace(' ', '+').replace('-', '+').replace('_', '/') + '==='
-    buffer = base64.b64decode(modified_request)
-    
-    decoded = Lz77.decompress(buffer)
-    xml = fromKBinXml(decoded)
-    result = toObject(xml)
+    result, relay, timings = await codec_pool.run(len(request), decode_body, request)
+    _collect(timings)
+    ctx.decodeTimings = timings
     
     if 'eacnet' in result:
         info = result['eacnet']['info']
@@ -41,7 +261,7 @@ async def eacnet(ctx, next):
             ctx.acRelayInfo = {
                 'module': request['module'],
                 'method': request['method'],
-                'request': xml['eacnet']['request']['data']
+                'request': relay
             }
         else:
             ctx.acRelayInfo = None
@@ -0,0 +1,300 @@
+# python -m <package>.migrations [--status] [--batch-size N] [--workers N]
+import argparse
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from pymongo import AsyncMongoClient, ReplaceOne, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from utils.config import config
+from .services.p2d.ghost import ghost_document
+from .services.p2d.user import read_pdata_player
+
+logger = logging.getLogger('database')
+
+def pdata_bytes(doc: Dict[str, Any]) -> bytes:
+    pdata = doc["pdata"]
+    # documents written by the node backend kept the blob as {"buffer": ...}
+    if isinstance(pdata, dict):
+        pdata = pdata["buffer"]
+    return bytes(pdata)
+
+def player_identity(player: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "djname": player["djname"],
+        "infinitas_id": player["infinitas_id"],
+    }
+
+def player_node(player: Dict[str, Any]) -> Dict[str, Any]:
+    return {"player": player}
+
+def compress_ghost_batch(_: Any, items: List[Tuple[Any, str, bytes]]) -> List[Dict[str, Any]]:
+    """Runs in a worker process: build the p2d_play_log_ghost document of each log."""
+    return [ghost_document(_id, player, ghost) for _id, player, ghost in items]
+
+def decode_batch(
+    extract: Callable[[Dict[str, Any]], Dict[str, Any]],
+    items: List[Tuple[Any, bytes]]
+) -> List[Tuple[Any, Optional[Dict[str, Any]]]]:
+    """
+    Runs in a worker process: read the player node of each pdata blob and derive the
+    fields to $set from it, without decoding the rest of the blob. Blobs that fail to
+    decode map to None so one bad document can't wedge the migration.
+    """
+    results = []
+    for _id, blob in items:
+        try:
+            results.append((_id, extract(read_pdata_player(blob))))
+        except Exception:
+            results.append((_id, None))
+    return results
+
+class MigrationRunner:
+    """
+    Applies the schema migrations in MIGRATIONS in order. Data migrations stream the
+    collection sorted by _id and record the last written _id in __metadata after each
+    batch, so a crashed run picks up where it stopped instead of starting over.
+    """
+
+    def __init__(self, db: AsyncDatabase, batch_size: Optional[int] = None, workers: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or config.migration_batch_size
+        self.workers = workers or config.migration_workers
+        self.executor: Optional[Executor] = None
+
+    @property
+    def meta_col(self) -> AsyncCollection:
+        return self.db['__metadata']
+
+    async def get_meta(self) -> Dict[str, Any]:
+        meta = await self.meta_col.find_one({})
+        if meta is None:
+            meta = {"version": 0}
+        return meta
+
+    async def pending(self) -> List[Tuple[int, str]]:
+        meta = await self.get_meta()
+        return [(version, name) for version, name, _ in MIGRATIONS if version > meta["version"]]
+
+    async def run(self) -> int:
+        meta = await self.get_meta()
+        todo = [m for m in MIGRATIONS if m[0] > meta["version"]]
+        if not todo:
+            return meta["version"]
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            self.executor = executor
+            try:
+                for version, name, step in todo:
+                    progress = meta.get("progress") or {}
+                    after = progress.get("after") if progress.get("version") == version else None
+                    if after is not None:
+                        logger.info('resuming database upgrade to ver %d after %s', version, after)
+                    else:
+                        logger.info('upgrading database to ver %d: %s', version, name)
+
+                    affected = await step(self, version, after)
+
+                    await self.meta_col.update_one(
+                        {},
+                        {"$set": {"version": version}, "$unset": {"progress": ""}},
+                        upsert=True
+                    )
+                    meta["version"] = version
+                    meta.pop("progress", None)
+                    logger.info('upgraded database to ver %d, effected %d', version, affected)
+            finally:
+                self.executor = None
+
+        return meta["version"]
+
+    async def stream_batches(
+        self,
+        version: int,
+        after: Any,
+        col: AsyncCollection,
+        query: Dict[str, Any],
+        projection: Dict[str, Any],
+        prepare: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+        write: Callable[[Any], Awaitable[int]]
+    ) -> int:
+        """
+        Walk the matching documents in _id order, batch_size at a time. Each batch is
+        prepared (the CPU heavy part) while the previous one is being written, and the
+        last _id of a batch is recorded as progress once its write has finished.
+        """
+        if after is not None:
+            query = {"$and": [query, {"_id": {"$gt": after}}]}
+
+        cursor = col.find(
+            query,
+            projection=projection,
+            sort=[("_id", 1)],
+            batch_size=self.batch_size
+        )
+
+        affected = 0
+        writing: Optional[asyncio.Task] = None
+        batch: List[Dict[str, Any]] = []
+
+        async def commit(results: Any, last_id: Any) -> int:
+            count = await write(results)
+            await self.meta_col.update_one(
+                {},
+                {"$set": {"progress": {"version": version, "after": last_id}}},
+                upsert=True
+            )
+            return count
+
+        async def flush(docs: List[Dict[str, Any]]):
+            nonlocal writing, affected
+            results = await prepare(docs)
+            # keep at most one write in flight so progress only moves forward
+            if writing is not None:
+                affected += await writing
+            writing = asyncio.ensure_future(commit(results, docs[-1]["_id"]))
+
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                await flush(batch)
+                batch = []
+
+        if batch:
+            await flush(batch)
+        if writing is not None:
+            affected += await writing
+
+        return affected
+
+    async def map_in_pool(self, func: Callable[..., List[Any]], arg: Any, items: List[Any]) -> List[Any]:
+        """Split items across the worker processes and run func(arg, part) on each part."""
+        loop = asyncio.get_running_loop()
+        chunk = -(-len(items) // self.workers)
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, func, arg, items[i:i + chunk])
+            for i in range(0, len(items), chunk)
+        ))
+        return [result for part in parts for result in part]
+
+    async def backfill_from_pdata(
+        self,
+        version: int,
+        after: Any,
+        collection: str,
+        query: Dict[str, Any],
+        extract: Callable[[Dict[str, Any]], Dict[str, Any]]
+    ) -> int:
+        col = self.db[collection]
+
+        async def prepare(docs: List[Dict[str, Any]]) -> List[Tuple[Any, Optional[Dict[str, Any]]]]:
+            return await self.map_in_pool(decode_batch, extract, [(doc["_id"], pdata_bytes(doc)) for doc in docs])
+
+        async def write(results: List[Tuple[Any, Optional[Dict[str, Any]]]]) -> int:
+            ops = []
+            for _id, fields in results:
+                if fields is None:
+                    logger.warning('skipping %s, pdata could not be decoded', _id)
+                    continue
+                ops.append(UpdateOne({"_id": _id}, {"$set": fields}))
+
+            if ops:
+                await col.bulk_write(ops, ordered=False)
+            return len(ops)
+
+        return await self.stream_batches(version, after, col, query, {"pdata": 1}, prepare, write)
+
+    async def move_ghosts(self, version: int, after: Any) -> int:
+        log_col = self.db['p2d_play_log']
+        ghost_col = self.db['p2d_play_log_ghost']
+
+        async def prepare(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            items = [(doc["_id"], doc["player"], bytes(doc["ghost"])) for doc in docs]
+            return await self.map_in_pool(compress_ghost_batch, None, items)
+
+        async def write(ghosts: List[Dict[str, Any]]) -> int:
+            # ghosts first, so a crash between the two writes never loses one
+            await ghost_col.bulk_write([
+                ReplaceOne({"_id": ghost["_id"]}, ghost, upsert=True) for ghost in ghosts
+            ], ordered=False)
+            await log_col.bulk_write([
+                UpdateOne({"_id": ghost["_id"]}, {"$unset": {"ghost": ""}}) for ghost in ghosts
+            ], ordered=False)
+            return len(ghosts)
+
+        # a null ghost has nothing to move, just drop the field
+        cleared = await log_col.update_many({"ghost": {"$type": "null"}}, {"$unset": {"ghost": ""}})
+        if cleared.modified_count:
+            logger.info('cleared %d null ghosts', cleared.modified_count)
+
+        return await self.stream_batches(
+            version,
+            after,
+            log_col,
+            {"ghost": {"$exists": True, "$ne": None}},
+            {"player": 1, "ghost": 1},
+            prepare,
+            write
+        )
+
+    async def rename_collections(self, version: int, after: Any) -> int:
+        collections = await self.db.list_collection_names()
+
+        async def try_rename_collection(src: str, dest: str) -> int:
+            if src not in collections:
+                return 0
+
+            await self.db[src].rename(dest)
+            return 1
+
+        renamed = await asyncio.gather(
+            try_rename_collection('player_play_data', 'p2d_play_data'),
+            try_rename_collection('player_music_data', 'p2d_music_data'),
+            try_rename_collection('player_play_log', 'p2d_play_log'),
+            try_rename_collection('player_course_log', 'p2d_course_log'),
+            try_rename_collection('player_customize_setting', 'p2d_customize_setting'),
+            try_rename_collection('player_rival_data', 'p2d_rival_data'),
+        )
+        return sum(renamed)
+
+MigrationStep = Callable[[MigrationRunner, int, Any], Awaitable[int]]
+
+MIGRATIONS: List[Tuple[int, str, MigrationStep]] = [
+    (1, 'store djname and infinitas_id next to pdata',
+        lambda runner, version, after: runner.backfill_from_pdata(
+            version, after, 'player_play_data', {}, player_identity)),
+    (2, 'rename collection prefix player to p2d',
+        lambda runner, version, after: runner.rename_collections(version, after)),
+    (3, 'denormalize the pdata player node',
+        lambda runner, version, after: runner.backfill_from_pdata(
+            version, after, 'p2d_play_data', {"player": {"$exists": False}}, player_node)),
+    (4, 'move play log ghosts to p2d_play_log_ghost',
+        lambda runner, version, after: runner.move_ghosts(version, after)),
+]
+
+async def main(args: argparse.Namespace):
+    client = AsyncMongoClient(config.mongo_url)
+    try:
+        runner = MigrationRunner(client[config.db_name], args.batch_size, args.workers)
+        if args.status:
+            meta = await runner.get_meta()
+            print(f'database version {meta["version"]}')
+            for version, name in await runner.pending():
+                print(f'  pending ver {version}: {name}')
+            if meta.get("progress"):
+                print(f'  interrupted run recorded: {meta["progress"]}')
+            return
+
+        version = await runner.run()
+        print(f'database is at ver {version}')
+    finally:
+        await client.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='apply pending database migrations')
+    parser.add_argument('--status', action='store_true', help='only report the schema version and pending migrations')
+    parser.add_argument('--batch-size', type=int, help='documents per cursor batch and bulk_write')
+    parser.add_argument('--workers', type=int, help='pdata decode worker processes')
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(parser.parse_args()))
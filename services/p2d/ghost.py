@@ -0,0 +1,29 @@
+import zlib
+from typing import Any, Dict
+from bson.binary import Binary
+
+# ghosts are a few KB of per-note timing bytes and compress well
+GHOST_CODEC = "zlib"
+GHOST_LEVEL = 6
+
+def ghost_document(log_id: Any, player: str, ghost: bytes) -> Dict[str, Any]:
+    """Build the p2d_play_log_ghost document holding the ghost of one play log."""
+    compressed = zlib.compress(ghost, GHOST_LEVEL)
+    if len(compressed) < len(ghost):
+        codec, data = GHOST_CODEC, compressed
+    else:
+        codec, data = "raw", ghost
+
+    return {
+        "_id": log_id,
+        "player": player,
+        "codec": codec,
+        "size": len(ghost),
+        "ghost": Binary(data),
+    }
+
+def ghost_bytes(document: Dict[str, Any]) -> bytes:
+    data = bytes(document["ghost"])
+    if document.get("codec") == GHOST_CODEC:
+        return zlib.decompress(data, bufsize=document.get("size") or zlib.DEF_BUF_SIZE)
+    return data
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import BulkWriteError
+from utils.config import config
+
+logger = logging.getLogger('log-writer')
+
+_CLOSE = object()
+_DUPLICATE_KEY = 11000
+
+class LogWriter:
+    """
+    Write-behind buffer for one log collection. put() only enqueues; a background
+    task drains the queue with insert_many once max_batch documents are waiting or
+    interval seconds have passed since the first one. When max_pending documents
+    are already queued put() waits, so a slow database pushes back on callers
+    instead of growing memory.
+
+    A failed insert is retried max_retries times with a doubling delay, only for
+    the documents that weren't written; documents the server already has (a
+    duplicate _id from an earlier, partly applied attempt) count as written.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncCollection,
+        max_batch: int,
+        max_pending: int,
+        interval: float,
+        max_retries: int,
+        retry_delay: float
+    ):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self.task: Optional[asyncio.Task] = None
+
+        self.flushed = 0
+        self.batches = 0
+        self.retried = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.last_flush_seconds = 0.0
+
+    async def put(self, document: Dict[str, Any]):
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+        await self.queue.put(document)
+
+    async def close(self):
+        if self.task is None or self.task.done():
+            return
+        await self.queue.put(_CLOSE)
+        await self.task
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self.queue.get()
+            if first is _CLOSE:
+                return
+
+            batch = [first]
+            closing = False
+            deadline = loop.time() + self.interval
+            while len(batch) < self.max_batch:
+                try:
+                    document = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        document = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+                if document is _CLOSE:
+                    closing = True
+                    break
+                batch.append(document)
+
+            await self._flush(batch)
+            if closing:
+                # anything queued behind the close marker still gets written
+                while not self.queue.empty():
+                    rest = [self.queue.get_nowait() for _ in range(min(self.queue.qsize(), self.max_batch))]
+                    await self._flush([document for document in rest if document is not _CLOSE])
+                return
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        attempt = 0
+        while batch:
+            # insert_many sets _id on the documents, so a retry can't insert one twice
+            batch = await self._insert(batch)
+            if not batch:
+                return
+
+            attempt += 1
+            if attempt > self.max_retries:
+                self.failed += len(batch)
+                logger.error('dropping %d logs for %s after %d retries', len(batch), self.collection.name, self.max_retries)
+                return
+
+            self.retried += len(batch)
+            await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+    async def _insert(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert batch once and return the documents that still have to be written."""
+        start = time.perf_counter()
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            self.flushed += len(batch)
+            return []
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            duplicates = sum(1 for error in errors if error.get("code") == _DUPLICATE_KEY)
+            retry = [batch[error["index"]] for error in errors if error.get("code") != _DUPLICATE_KEY]
+            self.flushed += len(batch) - len(errors)
+            self.duplicates += duplicates
+            if retry:
+                logger.warning('failed to write %d of %d logs to %s: %s', len(retry), len(batch), self.collection.name, e)
+            return retry
+        except Exception as e:
+            logger.warning('failed to write %d logs to %s: %s', len(batch), self.collection.name, e)
+            return batch
+        finally:
+            elapsed = time.perf_counter() - start
+            self.batches += 1
+            self.flush_seconds += elapsed
+            self.last_flush_seconds = elapsed
+            self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queue_depth': self.queue.qsize(),
+            'flushed': self.flushed,
+            'retried': self.retried,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'batches': self.batches,
+            'avg_flush_ms': self.flush_seconds / self.batches * 1000 if self.batches else 0.0,
+            'last_flush_ms': self.last_flush_seconds * 1000,
+            'max_flush_ms': self.max_flush_seconds * 1000,
+        }
+
+# one writer per log collection, shared by every UserService
+_writers: Dict[str, LogWriter] = {}
+
+def get_log_writer(collection: AsyncCollection) -> LogWriter:
+    writer = _writers.get(collection.name)
+    if writer is None:
+        writer = LogWriter(
+            collection,
+            config.log_flush_max_batch,
+            config.log_flush_max_pending,
+            config.log_flush_interval_ms / 1000,
+            config.log_flush_max_retries,
+            config.log_flush_retry_ms / 1000,
+        )
+        _writers[collection.name] = writer
+    return writer
+
+async def close_log_writers():
+    """Flush everything still buffered; call on shutdown."""
+    await asyncio.gather(*(writer.close() for writer in _writers.values()))
+    _writers.clear()
+
+def get_log_writer_stats() -> Dict[str, Any]:
+    return {name: writer.stats() for name, writer in _writers.items()}
@@ -0,0 +1,96 @@
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+def deep_sizeof(obj: Any) -> int:
+    """
+    Approximate memory held by a decoded pdata: dicts, lists, tuples, objects with
+    __slots__ (the typed form) and leaf values. Objects reached more than once, like
+    the blob every undecoded history of a typed pdata points at, count once.
+    """
+    size = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            for key, value in item.items():
+                size += sys.getsizeof(key)
+                stack.append(value)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        else:
+            for name in getattr(type(item), '__slots__', ()):
+                stack.append(getattr(item, name, None))
+    return size
+
+class PdataCache:
+    """
+    Bounded LRU of decoded pdata, one entry per player tagged with the check_sum
+    of the blob it was decoded from. Entries are only served after the caller has
+    confirmed the stored check_sum still matches, so other processes writing the
+    same player can't leave a stale copy behind.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[str, Tuple[str, Any, int]]' = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def __contains__(self, player: str) -> bool:
+        return player in self.entries
+
+    def get(self, player: str, check_sum: Optional[str]) -> Optional[Any]:
+        entry = self.entries.get(player)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry[0] != check_sum:
+            self.stale += 1
+            self.invalidate(player)
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(player)
+        return entry[1]
+
+    def put(self, player: str, check_sum: str, pdata: Any):
+        self.invalidate(player)
+
+        size = deep_sizeof(pdata)
+        if size > self.max_bytes:
+            return
+
+        self.entries[player] = (check_sum, pdata, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, (_, _, evicted) = self.entries.popitem(last=False)
+            self.bytes -= evicted
+            self.evictions += 1
+
+    def invalidate(self, player: str):
+        entry = self.entries.pop(player, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.stale
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
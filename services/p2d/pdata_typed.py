@@ -0,0 +1,122 @@
+import dataclasses
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Type, get_type_hints
+from utils.kbin import LAZY, KBinNode, KBinReader
+from ...types.p2d.pdata import History, HistoryItem, Pdata
+
+class LazyHistory(Mapping[str, HistoryItem]):
+    """
+    A History subtree ({"d0": {"time": ..., "val": ...}, ...}) left undecoded in
+    the pdata blob. It's only decoded when the history is actually read, which
+    most requests never do.
+    """
+
+    __slots__ = ('node', 'expanded')
+
+    def __init__(self, node: KBinNode):
+        self.node = node
+        self.expanded: Optional[Dict[str, HistoryItem]] = None
+
+    @classmethod
+    def wrap(cls, value: Any) -> Any:
+        # a history node the game repeated is decoded right away, as the plain list
+        if isinstance(value, list):
+            return [item.decode() if isinstance(item, KBinNode) else item for item in value]
+        return cls(value)
+
+    def to_dict(self) -> Dict[str, HistoryItem]:
+        """The plain dict form, an empty history node decodes to {}."""
+        if self.expanded is None:
+            self.expanded = self.node.decode()
+        return self.expanded
+
+    def __getitem__(self, name: str) -> HistoryItem:
+        return self.to_dict()[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __repr__(self) -> str:
+        state = 'undecoded' if self.expanded is None else f'{len(self.expanded)} entries'
+        return f'LazyHistory({state})'
+
+# per class: (field name, how to build it, nested class)
+_plans: Dict[type, List[Tuple[str, str, Optional[type]]]] = {}
+
+def _plan(cls: type) -> List[Tuple[str, str, Optional[type]]]:
+    plan = _plans.get(cls)
+    if plan is None:
+        plan = []
+        hints = get_type_hints(cls)
+        for f in dataclasses.fields(cls):
+            hint = hints[f.name]
+            if hint is History:
+                plan.append((f.name, 'history', None))
+            elif dataclasses.is_dataclass(hint):
+                plan.append((f.name, 'object', hint))
+            elif getattr(hint, '__origin__', None) is list and dataclasses.is_dataclass(hint.__args__[0]):
+                plan.append((f.name, 'list', hint.__args__[0]))
+            else:
+                plan.append((f.name, 'value', None))
+        _plans[cls] = plan
+    return plan
+
+_schemas: Dict[type, Dict[str, Any]] = {}
+
+def _schema(cls: type) -> Dict[str, Any]:
+    # KBinReader.select() schema of the nodes cls declares, histories left undecoded
+    schema = _schemas.get(cls)
+    if schema is None:
+        schema = {}
+        for name, kind, sub in _plan(cls):
+            if kind == 'history':
+                schema[name] = LAZY
+            elif sub is not None:
+                schema[name] = _schema(sub)
+            else:
+                schema[name] = None
+        _schemas[cls] = schema
+    return schema
+
+def build(cls: Type[Any], node: Any) -> Any:
+    """
+    Build cls from an object-mode node selected with its schema. Fields missing
+    from the node are None.
+    """
+    if not isinstance(node, dict):
+        return None
+
+    obj = cls.__new__(cls)
+    for name, kind, sub in _plan(cls):
+        value = node.get(name)
+        if value is not None:
+            if kind == 'history':
+                value = LazyHistory.wrap(value)
+            elif kind == 'object':
+                value = build(sub, value)
+            elif kind == 'list':
+                value = [build(sub, item) for item in (value if isinstance(value, list) else [value])]
+        object.__setattr__(obj, name, value)
+    return obj
+
+def decode_pdata_typed(pdata: bytes) -> Pdata:
+    """
+    Decode only what Pdata declares, straight from the blob: undeclared subtrees
+    are stepped over and histories stay undecoded until read. Module level so the
+    codec pool can run it in a worker.
+    """
+    # the histories keep the blob alive, so it must be bytes rather than a view
+    tree = KBinReader(bytes(pdata)).select({"pdata": _schema(Pdata)})
+    return build(Pdata, tree.get("pdata"))
+
+def pdata_to_dict(obj: Any) -> Any:
+    """Plain dict form of a typed pdata (or any part of it), e.g. for a JSON response."""
+    if isinstance(obj, LazyHistory):
+        return obj.to_dict()
+    if isinstance(obj, list):
+        return [pdata_to_dict(item) for item in obj]
+    if dataclasses.is_dataclass(obj):
+        return {f.name: pdata_to_dict(getattr(obj, f.name)) for f in dataclasses.fields(obj)}
+    return obj
@@ -1,69 +1,257 @@
+import base64
+import binascii
+import copy
+from bson import ObjectId
 from bson.binary import Binary
-from pymongo.database import Database
-from typing import Dict, Any, Optional, cast
-from pymongo.collection import Collection
+from bson.errors import InvalidId
+from pymongo.asynchronous.database import AsyncDatabase
+from typing import Callable, Dict, Any, List, Optional, Tuple, cast
+from pymongo import UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from utils.kbin import KBinReader
 from utils.kbinxml import fromKBinXml
+from utils.config import config
+from utils.codec_pool import codec_pool
+from .pdata_cache import PdataCache
+from .pdata_typed import decode_pdata_typed
+from .log_writer import get_log_writer
+from .ghost import ghost_document, ghost_bytes
+from ...datas.p2d.p2d import default_items_count, default_customize, default_other_customize
 from ...types.p2d.index import (
     PlayerPlayData,
     PlayerMusicData,
     PlayerPlayLog,
+    PlayerPlayLogGhost,
     PlayerCourseLog,
     PlayerCustomizeSetting,
     PlayerRivalData
 )
+from ...types.p2d.pdata import Pdata
+
+# left out of play log pages unless asked for
+PLAY_LOG_HEAVY_FIELDS = ("ghost",)
+
+def encode_cursor(*parts: Any) -> str:
+    raw = ":".join(str(part) for part in parts).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str, count: int) -> List[str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("invalid cursor")
+
+    parts = raw.split(":")
+    if len(parts) != count:
+        raise ValueError("invalid cursor")
+    return parts
+
+def parse_object_id(value: str) -> ObjectId:
+    try:
+        return ObjectId(value)
+    except InvalidId:
+        raise ValueError("invalid cursor")
+
+def play_log_cursor(play_log: PlayerPlayLog) -> str:
+    return encode_cursor(play_log["clock"], play_log["_id"])
+
+def course_log_cursor(course_log: PlayerCourseLog) -> str:
+    return encode_cursor(course_log["_id"])
+
+def decode_pdata(pdata: bytes) -> Dict[str, Any]:
+    # module level so the codec pool can run it in a worker
+    return fromKBinXml(pdata)["pdata"]
+
+def read_pdata_player(pdata: bytes) -> Dict[str, Any]:
+    """
+    Only the pdata/player node (raw shape, like decode_pdata), the rest of the
+    blob is scanned past without being decoded.
+    """
+    player = KBinReader(pdata).get("pdata/player", to_object=False)
+    if not isinstance(player, dict):
+        raise ValueError("pdata has no player node")
+    return player
+
+def music_data_filter(music_data: PlayerMusicData) -> Dict[str, Any]:
+    return {
+        "player": music_data["player"],
+        "music_id": music_data["music_id"],
+        "play_style": music_data["play_style"]
+    }
+
+def fill_music_data(music_data: PlayerMusicData) -> PlayerMusicData:
+    if "best_score_clock" not in music_data or music_data["best_score_clock"] is None:
+        music_data["best_score_clock"] = [-1, -1, -1, -1, -1]
+    return music_data
+
+def default_music_data(player: str, music_id: int, play_style: int) -> PlayerMusicData:
+    return {
+        "player": player,
+        "music_id": music_id,
+        "play_style": play_style,
+        "score": [0, 0, 0, 0, 0],
+        "clear_flag": [0, 0, 0, 0, 0],
+        "miss_count": [-1, -1, -1, -1, -1],
+        "play_num": [0, 0, 0, 0, 0],
+        "clear_num": [0, 0, 0, 0, 0],
+        "best_score_clock": [-1, -1, -1, -1, -1],
+    }
+
+# shared by every UserService, which is created per request
+pdata_cache = PdataCache(config.pdata_cache_max_bytes)
+# typed pdata (types/p2d/pdata.py) for callers that read fields rather than serve the tree
+typed_pdata_cache = PdataCache(config.pdata_cache_max_bytes)
+
+def get_pdata_cache_stats() -> Dict[str, Any]:
+    return {
+        'dict': pdata_cache.stats(),
+        'typed': typed_pdata_cache.stats(),
+    }
 
 class UserService:
-    def __init__(self, db: Database):
+    def __init__(
+        self,
+        db: AsyncDatabase,
+        cache: PdataCache = pdata_cache,
+        typed_cache: PdataCache = typed_pdata_cache
+    ):
         self.db = db
+        self.pdata_cache = cache
+        self.typed_pdata_cache = typed_cache
 
     @property
-    def play_data_col(self) -> Collection[PlayerPlayData]:
-        return cast(Collection[PlayerPlayData], self.db.get_collection('p2d_play_data'))
+    def play_data_col(self) -> AsyncCollection[PlayerPlayData]:
+        return cast(AsyncCollection[PlayerPlayData], self.db.get_collection('p2d_play_data'))
 
     @property
-    def music_data_col(self) -> Collection[PlayerMusicData]:
-        return cast(Collection[PlayerMusicData], self.db.get_collection("p2d_music_data"))
+    def music_data_col(self) -> AsyncCollection[PlayerMusicData]:
+        return cast(AsyncCollection[PlayerMusicData], self.db.get_collection("p2d_music_data"))
 
     @property
-    def play_log_col(self) -> Collection[PlayerPlayLog]:
-        return cast(Collection[PlayerPlayLog], self.db.get_collection('p2d_play_log'))
+    def play_log_col(self) -> AsyncCollection[PlayerPlayLog]:
+        return cast(AsyncCollection[PlayerPlayLog], self.db.get_collection('p2d_play_log'))
 
     @property
-    def course_log_col(self) -> Collection[PlayerCourseLog]:
-        return cast(Collection[PlayerCourseLog], self.db.get_collection('p2d_course_log'))
+    def play_log_ghost_col(self) -> AsyncCollection[PlayerPlayLogGhost]:
+        return cast(AsyncCollection[PlayerPlayLogGhost], self.db.get_collection('p2d_play_log_ghost'))
 
     @property
-    def customize_setting_col(self) -> Collection[PlayerCustomizeSetting]:
-        return cast(Collection[PlayerCustomizeSetting], self.db.get_collection('p2d_customize_setting'))
+    def course_log_col(self) -> AsyncCollection[PlayerCourseLog]:
+        return cast(AsyncCollection[PlayerCourseLog], self.db.get_collection('p2d_course_log'))
 
     @property
-    def rival_data_col(self) -> Collection[PlayerRivalData]:
-        return cast(Collection[PlayerRivalData], self.db.get_collection('p2d_rival_data'))
+    def customize_setting_col(self) -> AsyncCollection[PlayerCustomizeSetting]:
+        return cast(AsyncCollection[PlayerCustomizeSetting], self.db.get_collection('p2d_customize_setting'))
 
-    def add_course_log(self, course_log: PlayerCourseLog):
-        return self.course_log_col.insert_one(course_log)
+    @property
+    def rival_data_col(self) -> AsyncCollection[PlayerRivalData]:
+        return cast(AsyncCollection[PlayerRivalData], self.db.get_collection('p2d_rival_data'))
+
+    async def add_course_log(self, course_log: PlayerCourseLog):
+        if config.log_write_behind:
+            return await get_log_writer(self.course_log_col).put(course_log)
+        return await self.course_log_col.insert_one(course_log)
+
+    async def add_play_log(self, play_log: PlayerPlayLog):
+        ghost = play_log.get("ghost")
+        if ghost is not None:
+            # the ghost lives in its own collection under the log's _id
+            play_log = {key: value for key, value in play_log.items() if key != "ghost"}
+            play_log.setdefault("_id", ObjectId())
+            await self.add_play_log_ghost(ghost_document(play_log["_id"], play_log["player"], bytes(ghost)))
+
+        if config.log_write_behind:
+            return await get_log_writer(self.play_log_col).put(play_log)
+        return await self.play_log_col.insert_one(play_log)
+
+    async def add_play_log_ghost(self, ghost: Dict[str, Any]):
+        if config.log_write_behind:
+            return await get_log_writer(self.play_log_ghost_col).put(ghost)
+        return await self.play_log_ghost_col.insert_one(ghost)
+
+    async def get_play_log_ghost(self, log_id: ObjectId) -> Optional[bytes]:
+        result = await self.play_log_ghost_col.find_one({"_id": log_id})
+        if result:
+            return ghost_bytes(result)
 
-    def add_play_log(self, play_log: PlayerPlayLog):
-        return self.play_log_col.insert_one(play_log)
+        # logs written before ghosts were split out still carry it inline
+        result = await self.play_log_col.find_one({"_id": log_id}, projection={"ghost": 1})
+        if result and result.get("ghost") is not None:
+            return bytes(result["ghost"])
+
+        return None
 
-    def get_play_logs(self, player: str, skip=0, limit=10):
-        return list(self.play_log_col.find(
-            {"player": player},
-            sort=[("player", 1), ("clock", -1)],
+    async def attach_ghosts(self, play_logs: List[PlayerPlayLog]) -> List[PlayerPlayLog]:
+        """Load the ghosts of play_logs with one query, skipping logs that still have theirs inline."""
+        missing = [play_log["_id"] for play_log in play_logs if play_log.get("ghost") is None]
+        if not missing:
+            return play_logs
+
+        ghosts = {}
+        async for result in self.play_log_ghost_col.find({"_id": {"$in": missing}}):
+            ghosts[result["_id"]] = Binary(ghost_bytes(result))
+
+        for play_log in play_logs:
+            if play_log["_id"] in ghosts:
+                play_log["ghost"] = ghosts[play_log["_id"]]
+
+        return play_logs
+
+    async def get_play_logs(
+        self,
+        player: str,
+        skip=0,
+        limit=10,
+        after: Optional[str] = None,
+        with_ghost=False
+    ) -> List[PlayerPlayLog]:
+        """
+        Newest first. Pass the cursor of the last log of a page as after to seek
+        straight to the next one; skip is only kept for old clients.
+        """
+        query: Dict[str, Any] = {"player": player}
+        if after:
+            clock, last_id = decode_cursor(after, 2)
+            query["$or"] = [
+                {"clock": {"$lt": int(clock)}},
+                {"clock": int(clock), "_id": {"$lt": parse_object_id(last_id)}},
+            ]
+            skip = 0
+
+        play_logs = await self.play_log_col.find(
+            query,
+            projection=None if with_ghost else {field: 0 for field in PLAY_LOG_HEAVY_FIELDS},
+            sort=[("player", 1), ("clock", -1), ("_id", -1)],
             skip=skip,
             limit=limit
-        ))
-
-    def get_course_logs(self, player: str, skip=0, limit=10):
-        return list(self.course_log_col.find(
-            {"player": player},
+        ).to_list()
+
+        if with_ghost:
+            return await self.attach_ghosts(play_logs)
+        return play_logs
+
+    async def get_course_logs(
+        self,
+        player: str,
+        skip=0,
+        limit=10,
+        after: Optional[str] = None
+    ) -> List[PlayerCourseLog]:
+        query: Dict[str, Any] = {"player": player}
+        if after:
+            last_id, = decode_cursor(after, 1)
+            query["_id"] = {"$lt": parse_object_id(last_id)}
+            skip = 0
+
+        return await self.course_log_col.find(
+            query,
             sort=[("player", 1), ("_id", -1)],
             skip=skip,
             limit=limit
-        ))
+        ).to_list()
 
-    def upsert_customize_setting(self, customize_setting: PlayerCustomizeSetting):
-        return self.customize_setting_col.update_one(
+    async def upsert_customize_setting(self, customize_setting: PlayerCustomizeSetting):
+        return await self.customize_setting_col.update_one(
             {"_id": customize_setting["_id"]},
             {"$set": customize_setting},
             upsert=True
@@ -73,12 +261,7 @@ class UserService:
         result = await self.customize_setting_col.find_one({"_id": player})
         if result:
             if "items_count" not in result or result["items_count"] is None:
-                result["items_count"] = {
-                    "bit": 15000,
-                    "ldisc": 5,
-                    "infinitas_ticket": 50,
-                    "infinitas_ticket_free": 9,
-                }
+                result["items_count"] = dict(default_items_count)
 
             if not any(item["item_category"] == 12 for item in result["customize"]):
                 result["customize"].append({"item_category": 12, "item_id": "I2100000"})
@@ -87,31 +270,9 @@ class UserService:
 
         return {
             "_id": player,
-            "items_count": {
-                "bit": 15000,
-                "ldisc": 5,
-                "infinitas_ticket": 50,
-                "infinitas_ticket_free": 9,
-            },
-            "customize": [
-                {"item_category": 2, "item_id": "I1100000"},
-                {"item_category": 3, "item_id": "I1200000"},
-                {"item_category": 4, "item_id": "I1300000"},
-                {"item_category": 5, "item_id": "I1400000"},
-                {"item_category": 6, "item_id": "I1500000"},
-                {"item_category": 7, "item_id": "I1600000"},
-                {"item_category": 8, "item_id": "I1700000"},
-                {"item_category": 11, "item_id": "I1300000"},
-                {"item_category": 10, "item_id": "I1900000"},
-                {"item_category": 12, "item_id": "I2100000"},
-            ],
-            "other_customize": [
-                {"item_category": 1, "item_id": "C1000000"},
-                {"item_category": 2, "item_id": "C1100000"},
-                {"item_category": 3, "item_id": "C1200000"},
-                {"item_category": 4, "item_id": "C1300000"},
-                {"item_category": 5, "item_id": "C1400002"},
-            ]
+            "items_count": dict(default_items_count),
+            "customize": [dict(item) for item in default_customize],
+            "other_customize": [dict(item) for item in default_other_customize],
         }
 
     async def get_pdata_checksum(self, player: str) -> Optional[str]:
@@ -147,42 +308,92 @@ class UserService:
             "check_sum": result["check_sum"],
         }
 
-    async def get_pdata_decoded(self, player: str):
+    async def load_pdata(self, player: str, cache: PdataCache, decode: Callable[[bytes], Any]) -> Any:
+        # the returned pdata may be shared with other requests, don't mutate it
+        check_sum = None
+        if player in cache:
+            # cheap projection to revalidate before trusting the cached copy
+            check_sum = await self.get_pdata_checksum(player)
+
+        cached = cache.get(player, check_sum)
+        if cached is not None:
+            return cached
+
         binary = await self.get_pdata_binary(player)
         if not binary:
             return None
 
-        return fromKBinXml(binary["pdata"])["pdata"]
+        pdata = await codec_pool.run(len(binary["pdata"]), decode, binary["pdata"])
+        cache.put(player, binary["check_sum"], pdata)
+        return pdata
 
-    def upsert_pdata_binary(self, player: str, pdata: bytes, check_sum: str):
-        unpacked = fromKBinXml(pdata)
-        pdata_obj = unpacked["pdata"]
-        djname = pdata_obj["player"]["djname"]
-        infinitas_id = pdata_obj["player"]["infinitas_id"]
+    async def get_pdata_decoded(self, player: str):
+        return await self.load_pdata(player, self.pdata_cache, decode_pdata)
+
+    async def get_pdata_typed(self, player: str) -> Optional[Pdata]:
+        """
+        pdata as the slotted classes of types/p2d/pdata.py, with values already
+        converted and the history subtrees packed until read. Only the declared
+        fields are kept, serve get_pdata_decoded when the whole tree is needed.
+        """
+        return await self.load_pdata(player, self.typed_pdata_cache, decode_pdata_typed)
+
+    async def get_rival_players(self, players: List[str]) -> Dict[str, Any]:
+        """Resolve the pdata player node of every given player in one query."""
+        if not players:
+            return {}
+
+        cursor = self.play_data_col.find(
+            {"_id": {"$in": list(set(players))}},
+            projection={"player": 1}
+        )
 
-        return self.play_data_col.update_one(
+        result = {}
+        async for doc in cursor:
+            if "player" in doc:
+                result[doc["_id"]] = doc["player"]
+            else:
+                # written before the player node was denormalized
+                pdata = await self.get_pdata_decoded(doc["_id"])
+                if pdata:
+                    result[doc["_id"]] = pdata["player"]
+
+        return result
+
+    async def upsert_pdata_binary(self, player: str, pdata: bytes, check_sum: str):
+        player_node = await codec_pool.run(len(pdata), read_pdata_player, pdata)
+
+        # the blob isn't fully decoded here, the next read decodes and caches it
+        self.pdata_cache.invalidate(player)
+        self.typed_pdata_cache.invalidate(player)
+        return await self.play_data_col.update_one(
             {"_id": player},
             {"$set": {
-                "djname": djname,
-                "infinitas_id": infinitas_id,
+                "djname": player_node["djname"],
+                "infinitas_id": player_node["infinitas_id"],
+                "player": player_node,
                 "pdata": Binary(pdata),
                 "check_sum": check_sum,
             }},
             upsert=True
         )
 
-    def get_music_datas(self, player: str, play_style: int) -> PlayerMusicData:
-        return list(self.music_data_col.find({
+    async def get_music_datas(self, player: str, play_style: int) -> List[PlayerMusicData]:
+        return await self.music_data_col.find({
             "player": player,
             "play_style": play_style,
-        }))
+        }).to_list()
 
-    def get_play_log(self, player: str, clock: int) -> PlayerPlayLog:
-        return self.play_log_col.find_one({
+    async def get_play_log(self, player: str, clock: int, with_ghost=True) -> PlayerPlayLog:
+        result = await self.play_log_col.find_one({
             "player": player,
             "clock": clock,
         })
 
+        if result and with_ghost:
+            await self.attach_ghosts([result])
+        return result
+
     async def get_music_data(self, player: str, music_id: int, play_style: int) -> PlayerMusicData:
         result = await self.music_data_col.find_one({
             "player": player,
@@ -191,33 +402,54 @@ class UserService:
         })
 
         if result:
-            if "best_score_clock" not in result or result["best_score_clock"] is None:
-                result["best_score_clock"] = [-1, -1, -1, -1, -1]
-            return result
+            return fill_music_data(result)
 
-        return {
-            "player": player,
-            "music_id": music_id,
-            "play_style": play_style,
-            "score": [0, 0, 0, 0, 0],
-            "clear_flag": [0, 0, 0, 0, 0],
-            "miss_count": [-1, -1, -1, -1, -1],
-            "play_num": [0, 0, 0, 0, 0],
-            "clear_num": [0, 0, 0, 0, 0],
-            "best_score_clock": [-1, -1, -1, -1, -1],
-        }
+        return default_music_data(player, music_id, play_style)
+
+    async def get_music_data_many(self, player: str, charts: List[Tuple[int, int]]) -> List[PlayerMusicData]:
+        """Like get_music_data for every (music_id, play_style) in charts, in one query and in the same order."""
+        if not charts:
+            return []
 
-    def upsert_music_data(self, music_data: PlayerMusicData):
-        return self.music_data_col.update_one(
-            {
-                "player": music_data["player"],
-                "music_id": music_data["music_id"],
-                "play_style": music_data["play_style"]
-            },
+        charts = [(music_id, play_style) for music_id, play_style in charts]
+        wanted = list(dict.fromkeys(charts))
+        found = {}
+        # match exact pairs, separate $in lists would also match every cross combination
+        async for result in self.music_data_col.find({
+            "player": player,
+            "$or": [{"music_id": music_id, "play_style": play_style} for music_id, play_style in wanted],
+        }):
+            found[(result["music_id"], result["play_style"])] = fill_music_data(result)
+
+        music_datas = []
+        used = set()
+        for chart in charts:
+            music_data = found.get(chart)
+            if music_data is None:
+                music_data = default_music_data(player, *chart)
+            elif chart in used:
+                # a chart listed twice gets its own copy, so editing one slot leaves the other alone
+                music_data = copy.deepcopy(music_data)
+            used.add(chart)
+            music_datas.append(music_data)
+        return music_datas
+
+    async def upsert_music_data(self, music_data: PlayerMusicData):
+        return await self.music_data_col.update_one(
+            music_data_filter(music_data),
             {"$set": music_data},
             upsert=True
         )
 
+    async def upsert_music_data_many(self, music_datas: List[PlayerMusicData]):
+        if not music_datas:
+            return None
+
+        return await self.music_data_col.bulk_write([
+            UpdateOne(music_data_filter(music_data), {"$set": music_data}, upsert=True)
+            for music_data in music_datas
+        ], ordered=False)
+
     async def get_player_rival_data(self, player: str) -> PlayerRivalData:
         result = await self.rival_data_col.find_one({"_id": player})
 
@@ -236,8 +468,8 @@ class UserService:
             "dp": [],
         }
 
-    def upsert_player_rival_data(self, rival_data: PlayerRivalData):
-        return self.rival_data_col.update_one(
+    async def upsert_player_rival_data(self, rival_data: PlayerRivalData):
+        return await self.rival_data_col.update_one(
             {"_id": rival_data["_id"]},
             {"$set": rival_data},
             upsert=True
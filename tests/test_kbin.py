@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+# the codec modules import each other by bare name, like the app runs them
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'utils')]
+
+from utils.kbin import LAZY, KBinNode, KBinReader
+from utils.kbinxml import toKBinXml
+from utils.kxml_value import v
+
+
+PDATA = toKBinXml('pdata', {
+    'player': [
+        {'$id': '7', 'djname': v.str('FIRST'), 'stats': {'$k': '1', 'play': v.s32(3)}},
+        {'$id': '8', 'djname': v.str('SECOND')},
+    ],
+})
+
+
+class FindTest(unittest.TestCase):
+
+    def test_path_inside_another_wanted_path(self):
+        paths = ['pdata/player', 'pdata/player/djname', 'pdata/player/@id', 'pdata/player/stats/@k']
+        for to_object in (True, False):
+            tree = KBinReader(PDATA).read(to_object)
+            player = tree['pdata']['player'][0]
+            found = KBinReader(PDATA).find(paths, to_object)
+            self.assertEqual(found['pdata/player'], player)
+            self.assertEqual(found['pdata/player/djname'], player['djname'])
+            self.assertEqual(found['pdata/player/@id'], '7')
+            self.assertEqual(found['pdata/player/stats/@k'], '1')
+
+    def test_root_and_leaf(self):
+        found = KBinReader(PDATA).find(['pdata', 'pdata/player/stats/play', 'pdata/missing'])
+        self.assertEqual(found['pdata'], KBinReader(PDATA).read(True)['pdata'])
+        self.assertEqual(found['pdata/player/stats/play'], 3)
+        self.assertNotIn('pdata/missing', found)
+
+
+class SelectTest(unittest.TestCase):
+
+    def test_only_named_nodes_are_decoded(self):
+        full = KBinReader(PDATA).read(True)['pdata']['player']
+        tree = KBinReader(PDATA).select({'pdata': {'player': {'id': None, 'stats': LAZY}}})
+        first, second = tree['pdata']['player']
+        self.assertEqual(first['id'], '7')
+        self.assertNotIn('djname', first)
+        self.assertIsInstance(first['stats'], KBinNode)
+        self.assertEqual(first['stats'].decode(), full[0]['stats'])
+        self.assertEqual(second, {'id': '8'})
+
+
+if __name__ == '__main__':
+    unittest.main()
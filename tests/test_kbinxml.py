@@ -0,0 +1,64 @@
+import contextlib
+import io
+import os
+import sys
+import unittest
+import xml.etree.ElementTree as ET
+
+# the codec modules import each other by bare name, like the app runs them
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'utils')]
+
+from utils.kbinxml import compileConverter, fromKBinXml, toKBinXml, toObject
+from utils.kxml_value import v
+
+
+def entry(value: str):
+    return {"id": {"$__type": "s32", "__value": value}, "name": {"$__type": "str", "__value": "a" + value}}
+
+
+class CompileConverterTest(unittest.TestCase):
+
+    def test_single_node_sample_then_list(self):
+        convert = compileConverter({"entry": entry("1")})
+        node = {"entry": [entry("1"), entry("2")]}
+        self.assertEqual(convert(node), toObject(node))
+
+    def test_list_sample_then_single_node(self):
+        convert = compileConverter({"entry": [entry("1"), entry("2")]})
+        node = {"entry": entry("3")}
+        self.assertEqual(convert(node), toObject(node))
+
+    def test_value_sample_then_list(self):
+        convert = compileConverter({"id": entry("1")["id"]})
+        node = {"id": [entry("1")["id"], entry("2")["id"]]}
+        self.assertEqual(convert(node), toObject(node))
+
+
+class DumpXmlTest(unittest.TestCase):
+
+    def test_dump_xml_prints_the_decoded_document(self):
+        data = toKBinXml('response', {
+            '$status': '0',
+            'id': v.s32(5),
+            'data': v.bin(b'\x01\x02'),
+            'name': v.str('a<b'),
+            'entry': [{'val': v.u8([1, 2])}, {}],
+        })
+        for to_object in (False, True):
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                result = fromKBinXml(data, dump_xml=True, to_object=to_object)
+            self.assertEqual(result, fromKBinXml(data, to_object=to_object))
+
+            root = ET.fromstring(out.getvalue().split('?>', 1)[1])
+            self.assertEqual(root.tag, 'response')
+            self.assertEqual(root.get('status'), '0')
+            self.assertEqual(root.find('id').text, '5')
+            self.assertEqual(root.find('data').text, '0102')
+            self.assertEqual(root.find('name').text, 'a<b')
+            self.assertEqual(root.find('entry/val').get('__count'), '2')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import asyncio
+import base64
+import importlib
+import json
+import os
+import sys
+import unittest
+
+from bson import Binary, ObjectId
+from fastapi.encoders import jsonable_encoder
+
+# the apis import the services relatively, so load them as part of the repo package
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.dirname(ROOT), ROOT, os.path.join(ROOT, 'utils')]
+p2d_api = importlib.import_module(os.path.basename(ROOT) + '.apis.p2d.index')
+
+
+class FakeUserService:
+
+    def __init__(self, play_logs):
+        self.play_logs = play_logs
+
+    async def get_play_logs(self, player, skip, limit, after=None, with_ghost=False):
+        return self.play_logs[:limit]
+
+
+class PlaylogTest(unittest.TestCase):
+
+    def test_response_with_ghosts_serializes(self):
+        log_id = ObjectId()
+        play_logs = [
+            {"_id": log_id, "player": "p", "clock": 100, "ghost": Binary(b"\x00\x01ghost")},
+            {"_id": ObjectId(), "player": "p", "clock": 90},
+        ]
+        response = asyncio.run(p2d_api.get_playlog(
+            "p", skip=None, limit=2, after=None, ghost=True, user_service=FakeUserService(play_logs)
+        ))
+
+        body = json.loads(json.dumps(jsonable_encoder(response)))
+        first, second = body["playLogs"]
+        self.assertEqual(first["_id"], str(log_id))
+        self.assertEqual(base64.b64decode(first["ghost"]), b"\x00\x01ghost")
+        self.assertNotIn("ghost", second)
+        self.assertIsNotNone(body["next"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,6 +12,8 @@ class PlayerPlayData:
     check_sum: str
     djname: str
     infinitas_id: str
+    # copy of pdata/player, served to rivals without decoding pdata
+    player: Dict[str, Any]
 
 
 @dataclass
@@ -62,9 +64,21 @@ class PlayerPlayLog:
     arrange_1: int
     assist: int
     flip: int
+    # only on logs written before ghosts moved to PlayerPlayLogGhost
     ghost: Binary
     modifier: int
 
+@dataclass
+class PlayerPlayLogGhost:
+    # _id of the PlayerPlayLog
+    _id: ObjectId
+    player: str
+    # "zlib" or "raw"
+    codec: str
+    # uncompressed length
+    size: int
+    ghost: Binary
+
 @dataclass
 class CourseStage:
     stage_num: int
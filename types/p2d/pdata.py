@@ -1,5 +1,4 @@
-from typing import Dict, List, Any, TypedDict
-from bson import Binary, ObjectId
+from typing import Dict, List, TypedDict
 from dataclasses import dataclass, field
 
 class HistoryItem(TypedDict):
@@ -9,26 +8,26 @@ class HistoryItem(TypedDict):
 class History(TypedDict, total=False):
     __extra__: Dict[str, HistoryItem]
 
-@dataclass
+@dataclass(slots=True)
 class Bit:
     boost_expire_date: int
     consume_bit: int
     total_bit: int
 
-@dataclass
+@dataclass(slots=True)
 class Kind:
     id: int
 
-@dataclass
+@dataclass(slots=True)
 class SPClass:
     kind: List[Kind] = field(default_factory=list)
 
-@dataclass
+@dataclass(slots=True)
 class Dan:
     dp: SPClass = field(default_factory=SPClass)
     sp: SPClass = field(default_factory=SPClass)
 
-@dataclass
+@dataclass(slots=True)
 class Effector:
     effect_type: int
     filter: int
@@ -39,22 +38,22 @@ class Effector:
     play_volume: int
     vefx: int
 
-@dataclass
+@dataclass(slots=True)
 class Frame:
     expire_date: int
 
-@dataclass
+@dataclass(slots=True)
 class FrameList:
     frame0: Frame
     frame1: Frame
     frame2: Frame
 
-@dataclass
+@dataclass(slots=True)
 class Mission:
     frame_list: FrameList
     mission_list: History
 
-@dataclass
+@dataclass(slots=True)
 class KeyConfig:
     sw_0: int
     sw_1: int
@@ -93,7 +92,7 @@ class KeyConfig:
     sw_34: int
     sw_35: int
 
-@dataclass
+@dataclass(slots=True)
 class Option:
     anykey_dp: int
     anykey_sp: int
@@ -173,7 +172,7 @@ class Option:
     timing_type_dp: int
     timing_type_sp: int
 
-@dataclass
+@dataclass(slots=True)
 class Player:
     achievement_dp: int
     achievement_sp: int
@@ -185,12 +184,12 @@ class Player:
     play_num_sp: int
     pref_id: int
 
-@dataclass
+@dataclass(slots=True)
 class Rival:
     challenge_crush_num_dp: int
     challenge_crush_num_sp: int
 
-@dataclass
+@dataclass(slots=True)
 class CtrlHit:
     sw_01: int
     sw_02: int
@@ -205,13 +204,13 @@ class CtrlHit:
     sw_11: int
     tt_mv: int
 
-@dataclass
+@dataclass(slots=True)
 class Side:
     ctrl_count: int
     ctrl_hit: CtrlHit
     ctrl_type: int
 
-@dataclass
+@dataclass(slots=True)
 class DPPlayTime:
     hist: History
     last_end: int
@@ -219,7 +218,7 @@ class DPPlayTime:
     max: int
     total: int
 
-@dataclass
+@dataclass(slots=True)
 class SPPlayTime:
     hist: History
     last_end: int
@@ -227,28 +226,28 @@ class SPPlayTime:
     max: int
     total: int
 
-@dataclass
+@dataclass(slots=True)
 class StatsDP:
     djpoint_hist: History
     grade_hist: History
     mrank_hist: History
     play_time: DPPlayTime
 
-@dataclass
+@dataclass(slots=True)
 class SP:
     djpoint_hist: History
     grade_hist: History
     mrank_hist: History
     play_time: SPPlayTime
 
-@dataclass
+@dataclass(slots=True)
 class Stats:
     dp: StatsDP
     left: Side
     right: Side
     sp: SP
 
-@dataclass
+@dataclass(slots=True)
 class Pdata:
     bit: Bit
     dan: Dan
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+from utils.config import config
+
+T = TypeVar('T')
+
+def _warm_up():
+    """
+    Worker initializer: import the codecs and push a tiny document through them, so
+    the first real job doesn't pay for imports and cold code paths.
+    """
+    from kbin import decode_kbin, encode_kbin
+    from lz77 import Lz77
+
+    lz = Lz77()
+    document = encode_kbin('warmup', {'value': {'$__type': 's32', '__value': 1}})
+    decode_kbin(lz.decompress(lz.compress(document)), True)
+
+def estimate_tree_size(obj: Any, limit: int) -> int:
+    """
+    Rough encoded size of a tree about to be written as kbin, for deciding where to
+    encode it before it is encoded. The walk stops as soon as limit is reached, so
+    large trees cost no more to estimate than one at the threshold.
+    """
+    size = 0
+    stack = [obj]
+    while stack and size < limit:
+        item = stack.pop()
+        if isinstance(item, (str, bytes, bytearray)):
+            size += len(item) + 8
+        elif isinstance(item, Mapping):
+            size += 8
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif hasattr(item, 'itemsize'):
+            # array.array and ndarray values
+            size += len(item) * item.itemsize
+        else:
+            # numbers, and pre-encoded fragments which are only copied
+            size += 8
+    return size
+
+class LoopLagMonitor:
+    """
+    Sleeps interval seconds in a loop and records how late it wakes up. The overshoot
+    is time the event loop spent blocked in someone's code, whatever caused it.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.task: Optional[asyncio.Task] = None
+        self.samples = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.samples += 1
+            self.total += lag
+            self.worst = max(self.worst, lag)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'samples': self.samples,
+            'avg_lag_ms': self.total / self.samples * 1000 if self.samples else 0.0,
+            'max_lag_ms': self.worst * 1000,
+        }
+
+class CodecPool:
+    """
+    Runs codec work (lz77, kbin) for payloads of at least threshold bytes in a
+    process pool, so one large upload can't stall every other request. Smaller
+    payloads run inline, where the pickling round trip would cost more than the
+    work. At most workers + max_queue jobs are admitted at once; further callers
+    wait up to queue_timeout seconds for a slot and then fail.
+    """
+
+    def __init__(self, workers: int, threshold: int, max_queue: int, queue_timeout: float):
+        self.workers = workers
+        self.threshold = threshold
+        self.queue_timeout = queue_timeout
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self.max_slots = workers + max_queue
+        self.lag = LoopLagMonitor()
+
+        self.inline_calls = 0
+        self.inline_seconds = 0.0
+        self.inline_worst = 0.0
+        self.offloaded_calls = 0
+        self.offloaded_seconds = 0.0
+        self.in_flight = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        self.lag.start()
+        if self.workers > 0 and self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+            self.slots = asyncio.Semaphore(self.max_slots)
+
+    async def run(self, size: int, func: Callable[..., T], *args: Any) -> T:
+        """
+        Call func(*args), in a worker when size reaches the threshold. func and its
+        arguments must be picklable, pass bytes rather than memoryviews.
+        """
+        self._ensure_started()
+
+        if self.executor is None or size < self.threshold:
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.inline_calls += 1
+                self.inline_seconds += elapsed
+                self.inline_worst = max(self.inline_worst, elapsed)
+
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Exception(f'codec pool queue full, {func.__name__} of {size} bytes dropped')
+
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+            self.offloaded_calls += 1
+            self.offloaded_seconds += time.perf_counter() - start
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.lag.task is not None:
+            self.lag.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'threshold': self.threshold,
+            'in_flight': self.in_flight,
+            'rejected': self.rejected,
+            'inline_calls': self.inline_calls,
+            # inline work is exactly the time the loop was blocked by codec calls
+            'inline_blocking_ms': self.inline_seconds * 1000,
+            'inline_max_ms': self.inline_worst * 1000,
+            'offloaded_calls': self.offloaded_calls,
+            'offloaded_avg_ms': self.offloaded_seconds / self.offloaded_calls * 1000 if self.offloaded_calls else 0.0,
+            'loop_lag': self.lag.stats(),
+        }
+
+codec_pool = CodecPool(
+    config.codec_pool_workers,
+    config.codec_offload_threshold,
+    config.codec_pool_max_queue,
+    config.codec_pool_queue_timeout,
+)
+
+def get_codec_pool_stats() -> Dict[str, Any]:
+    return codec_pool.stats()
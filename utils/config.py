@@ -1,4 +1,5 @@
 import os
+from typing import Dict
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -24,6 +25,142 @@ class Config:
     def db_name(self) -> str:
         return os.environ.get("DB_NAME", "laochan-eacnet")
 
+    @property
+    def mongo_min_pool_size(self) -> int:
+        return int(os.environ.get("MONGO_MIN_POOL_SIZE", 5))
+
+    @property
+    def mongo_max_pool_size(self) -> int:
+        return int(os.environ.get("MONGO_MAX_POOL_SIZE", 100))
+
+    @property
+    def mongo_wait_queue_timeout_ms(self) -> int:
+        return int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000))
+
+    @property
+    def eacnet_max_compressed_size(self) -> int:
+        return int(os.environ.get("EACNET_MAX_COMPRESSED_SIZE", 2 * 1024 * 1024))
+
+    @property
+    def eacnet_max_decompressed_size(self) -> int:
+        return int(os.environ.get("EACNET_MAX_DECOMPRESSED_SIZE", 16 * 1024 * 1024))
+
+    @property
+    def eacnet_compress_min_size(self) -> int:
+        return int(os.environ.get("EACNET_COMPRESS_MIN_SIZE", 256))
+
+    @property
+    def eacnet_compress_budget_ms(self) -> float:
+        return float(os.environ.get("EACNET_COMPRESS_BUDGET_MS", 20))
+
+    @property
+    def codec_pool_workers(self) -> int:
+        return int(os.environ.get("CODEC_POOL_WORKERS", 2))
+
+    @property
+    def codec_offload_threshold(self) -> int:
+        return int(os.environ.get("CODEC_OFFLOAD_THRESHOLD", 64 * 1024))
+
+    @property
+    def codec_pool_max_queue(self) -> int:
+        return int(os.environ.get("CODEC_POOL_MAX_QUEUE", 64))
+
+    @property
+    def codec_pool_queue_timeout(self) -> float:
+        return float(os.environ.get("CODEC_POOL_QUEUE_TIMEOUT", 10))
+
+    @property
+    def migrate_on_startup(self) -> bool:
+        return os.environ.get("MIGRATE_ON_STARTUP", "true").lower() not in ("0", "false", "no")
+
+    @property
+    def migration_batch_size(self) -> int:
+        return int(os.environ.get("MIGRATION_BATCH_SIZE", 500))
+
+    @property
+    def migration_workers(self) -> int:
+        return int(os.environ.get("MIGRATION_WORKERS", os.cpu_count() or 1))
+
+    @property
+    def log_write_behind(self) -> bool:
+        return os.environ.get("LOG_WRITE_BEHIND", "true").lower() not in ("0", "false", "no")
+
+    @property
+    def log_flush_max_batch(self) -> int:
+        return int(os.environ.get("LOG_FLUSH_MAX_BATCH", 200))
+
+    @property
+    def log_flush_max_pending(self) -> int:
+        return int(os.environ.get("LOG_FLUSH_MAX_PENDING", 5000))
+
+    @property
+    def log_flush_interval_ms(self) -> int:
+        return int(os.environ.get("LOG_FLUSH_INTERVAL_MS", 250))
+
+    @property
+    def log_flush_max_retries(self) -> int:
+        return int(os.environ.get("LOG_FLUSH_MAX_RETRIES", 5))
+
+    @property
+    def log_flush_retry_ms(self) -> int:
+        return int(os.environ.get("LOG_FLUSH_RETRY_MS", 500))
+
+    @property
+    def pdata_cache_max_bytes(self) -> int:
+        return int(os.environ.get("PDATA_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+    @property
+    def ea3_max_connections(self) -> int:
+        return int(os.environ.get("EA3_MAX_CONNECTIONS", 100))
+
+    @property
+    def ea3_max_connections_per_host(self) -> int:
+        return int(os.environ.get("EA3_MAX_CONNECTIONS_PER_HOST", 32))
+
+    @property
+    def ea3_keepalive_timeout(self) -> float:
+        return float(os.environ.get("EA3_KEEPALIVE_TIMEOUT", 30))
+
+    @property
+    def ea3_connect_timeout(self) -> float:
+        return float(os.environ.get("EA3_CONNECT_TIMEOUT", 5))
+
+    @property
+    def ea3_read_timeout(self) -> float:
+        return float(os.environ.get("EA3_READ_TIMEOUT", 15))
+
+    @property
+    def ea3_max_inflight(self) -> int:
+        return int(os.environ.get("EA3_MAX_INFLIGHT", 64))
+
+    @property
+    def ea3_queue_timeout(self) -> float:
+        return float(os.environ.get("EA3_QUEUE_TIMEOUT", 10))
+
+    @property
+    def ea3_cache_ttls(self) -> Dict[str, float]:
+        # opt-in per relayed method, e.g. "system.getmaster=60,event.get=30"
+        # only list methods whose response doesn't depend on the card
+        # parsed once by the relay cache at import, so a bad value fails startup
+        ttls = {}
+        for item in os.environ.get("EA3_CACHE_TTLS", "").split(","):
+            if not item.strip():
+                continue
+            name, sep, ttl = item.partition("=")
+            name = name.strip()
+            try:
+                seconds = float(ttl)
+            except ValueError:
+                seconds = None
+            if not sep or "." not in name or seconds is None or not 0 < seconds < float("inf"):
+                raise ValueError(f"EA3_CACHE_TTLS: expected module.method=seconds, got {item.strip()!r}")
+            ttls[name] = seconds
+        return ttls
+
+    @property
+    def ea3_cache_max_entries(self) -> int:
+        return int(os.environ.get("EA3_CACHE_MAX_ENTRIES", 1024))
+
     @property
     def is_dev(self) -> bool:
         return os.environ.get("NODE_ENV") != "production"
@@ -1,11 +1,15 @@
-import requests
+import asyncio
+import aiohttp
 from typing import Dict, Any, TypeVar, Generic, Optional, Union
 
-from utils.types import AcRelayInfo
-from utils.kbinxml import fromKBinXml, toKBinXml, toObject
+from utils.context import AcRelayInfo
+from utils.kbin import KBinReader
+from utils.kbinxml import fromKBinXml, toKBinXml, toObjectCached
 from utils.kxml_value import Serializable
 from utils.lz77 import Lz77
+from utils.ea3_cache import Ea3RelayCache
 from utils.laochan_id import token_to_card_number
+from utils.codec_pool import codec_pool, estimate_tree_size
 from utils.config import *
 
 PCB_ID = '1A0C1A0C1A0C1A0C1A0C'
@@ -13,12 +17,59 @@ PCB_ID = '1A0C1A0C1A0C1A0C1A0C'
 T = TypeVar('T')
 LZ77 = Lz77()
 
-async def requestEa3(info: AcRelayInfo, model: str, token: str, ea3Url: str = 'http://maomani.cn:573/') -> Dict[str, Union[int, Serializable]]:
+relay_cache = Ea3RelayCache(config.ea3_cache_max_entries, config.ea3_cache_ttls)
+
+def get_ea3_cache_stats() -> Dict[str, Any]:
+    return relay_cache.stats()
+
+# shared keep-alive pool for every relayed call, created on first use inside the event loop
+_session: Optional[aiohttp.ClientSession] = None
+_inflight: Optional[asyncio.Semaphore] = None
+
+def get_ea3_session() -> aiohttp.ClientSession:
+    global _session, _inflight
+
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=config.ea3_max_connections,
+            limit_per_host=config.ea3_max_connections_per_host,
+            keepalive_timeout=config.ea3_keepalive_timeout,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=config.ea3_connect_timeout,
+            sock_read=config.ea3_read_timeout,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _inflight = asyncio.Semaphore(config.ea3_max_inflight)
+
+    return _session
+
+async def close_ea3_session():
+    global _session, _inflight
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _inflight = None
+
+def encode_call(call: Serializable, dump_xml: bool) -> bytes:
+    # module level so the codec pool can run it in a worker
+    return LZ77.compress(toKBinXml('call', call, 'UTF-8', dump_xml))
+
+def decompress_response(raw: bytes) -> bytes:
+    return LZ77.decompress(raw)
+
+def response_status(data: bytes, module: str) -> int:
+    # only the status attribute, read without decoding the rest of the response
+    return int(KBinReader(data).get(f'response/{module}/@status', '0'))
+
+async def postEa3(info: AcRelayInfo, model: str, token: str, ea3Url: str) -> bytes:
 
     if config.is_dev:
         print('ea3 call:')
 
-    request = toKBinXml('call', {
+    call = {
         info.module: {
             '$method': info.method,
             '$model': model,
@@ -26,32 +77,65 @@ async def requestEa3(info: AcRelayInfo, model: str, token: str, ea3Url: str = 'h
             '$srcid': PCB_ID,
             **info.request,
         },
-    }, 'UTF-8', config.is_dev)
-
-    compressed = LZ77.compress(request.data)
+    }
+    size = estimate_tree_size(call, codec_pool.threshold)
+    compressed = await codec_pool.run(size, encode_call, call, config.is_dev)
     
     headers = {
         'X-Compress': 'lz77',
     }
-    
-    response = requests.post(
-        f"{ea3Url}/?model={model}&f={info.module}.{info.method}",
-        data=compressed,
-        headers=headers
-    )
-    
-    raw = bytearray(response.content)
-    if response.headers.get('x-compress') == 'lz77':
-        result = bytearray(LZ77.decompress(raw))
+
+    session = get_ea3_session()
+    inflight = _inflight
+
+    # bound in-flight upstream calls so a stalled upstream can't pile up unbounded work
+    try:
+        await asyncio.wait_for(inflight.acquire(), config.ea3_queue_timeout)
+    except asyncio.TimeoutError:
+        raise Exception(f'ea3 relay queue full, {info.module}.{info.method} dropped')
+
+    try:
+        async with session.post(
+            f"{ea3Url}/?model={model}&f={info.module}.{info.method}",
+            data=compressed,
+            headers=headers
+        ) as response:
+            raw = bytearray(await response.read())
+            compress = response.headers.get('x-compress')
+    finally:
+        inflight.release()
+
+    if compress == 'lz77':
+        return await codec_pool.run(len(raw), decompress_response, bytes(raw))
+
+    return bytes(raw)
+
+def getStatus(response_data: Dict[str, Any], module: str) -> int:
+    return int(response_data['response'].get(module, {}).get('$status', '0'))
+
+async def requestEa3(info: AcRelayInfo, model: str, token: str, ea3Url: str = 'http://maomani.cn:573/') -> Dict[str, Union[int, Serializable]]:
+    ttl = relay_cache.ttls.get(f'{info.module}.{info.method}')
+
+    if ttl:
+        # cached responses are kept encoded, every caller decodes its own copy
+        size = estimate_tree_size(info.request, codec_pool.threshold)
+        request = await codec_pool.run(size, toKBinXml, info.module, info.request)
+        key = Ea3RelayCache.make_key(info.module, info.method, model, request)
+        result = await relay_cache.get_or_fetch(
+            key,
+            ttl,
+            lambda: postEa3(info, model, token, ea3Url),
+            lambda data: response_status(data, info.module) == 0
+        )
     else:
-        result = raw
+        result = await postEa3(info, model, token, ea3Url)
 
     if config.is_dev:
         print('ea3 response:')
 
-    response_data = fromKBinXml(result, config.is_dev)
+    response_data = await codec_pool.run(len(result), fromKBinXml, result, config.is_dev)
     
-    status = int(response_data['response'].get(info.module, {}).get('$status', '0'))
+    status = getStatus(response_data, info.module)
     
     return {
         'status': status,
@@ -60,4 +144,5 @@ async def requestEa3(info: AcRelayInfo, model: str, token: str, ea3Url: str = 'h
 
 async def requestEa3Typed(info: AcRelayInfo, model: str, token: str, ea3Url: Optional[str] = None) -> T:
     result = await requestEa3(info, model, token, ea3Url)
-    return toObject(result['response'])
\ No newline at end of file
+    # responses of one module.method share a shape, reuse the converter compiled for it
+    return toObjectCached(f'{info.module}.{info.method}', result['response'])
\ No newline at end of file
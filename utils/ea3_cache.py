@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+class Ea3RelayCache:
+    """
+    TTL cache for relayed EA3 responses with single-flight coalescing: while a
+    key is being fetched, every other caller asking for it awaits the same
+    upstream call instead of issuing its own.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttls: Optional[Dict[str, float]] = None):
+        self.max_entries = max_entries
+        # seconds per "module.method", methods not listed aren't cached
+        self.ttls: Dict[str, float] = dict(ttls) if ttls else {}
+        self.entries: 'OrderedDict[str, Tuple[float, bytes]]' = OrderedDict()
+        self.pending: Dict[str, 'asyncio.Task[bytes]'] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(module: str, method: str, model: str, request: bytes) -> str:
+        digest = hashlib.sha256()
+        for part in (module, method, model):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(request)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: bytes, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get_or_fetch(
+        self,
+        key: str,
+        ttl: float,
+        fetch: Callable[[], Awaitable[bytes]],
+        store_if: Optional[Callable[[bytes], bool]] = None
+    ) -> bytes:
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self.pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch(key, ttl, fetch, store_if))
+            # keep errors of a fetch nobody waits for anymore out of the loop's log
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.pending[key] = task
+        else:
+            self.coalesced += 1
+
+        # a cancelled caller must not cancel the fetch other callers are waiting on
+        return await asyncio.shield(task)
+
+    async def _fetch(
+        self,
+        key: str,
+        ttl: float,
+        fetch: Callable[[], Awaitable[bytes]],
+        store_if: Optional[Callable[[bytes], bool]]
+    ) -> bytes:
+        try:
+            value = await fetch()
+            if store_if is None or store_if(value):
+                self.put(key, value, ttl)
+            return value
+        finally:
+            self.pending.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self.entries),
+            'in_flight': len(self.pending),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,1059 @@
+# binary layout follows https://github.com/mon/kbinxml (kbinxml/kbinxml.py)
+
+import codecs
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, MutableMapping
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from typing_extensions import Final
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+SIGNATURE: Final[int] = 0xA0
+
+SIG_COMPRESSED: Final[int] = 0x42
+SIG_UNCOMPRESSED: Final[int] = 0x45
+
+NODE_START: Final[int] = 1
+NODE_ATTR: Final[int] = 46
+NODE_END: Final[int] = 190
+SECTION_END: Final[int] = 191
+
+ARRAY_FLAG: Final[int] = 64
+
+# encoding byte in the header -> python codec name
+ENCODINGS: Final[Dict[int, str]] = {
+    0x00: "cp932",
+    0x20: "ascii",
+    0x40: "iso-8859-1",
+    0x60: "euc_jp",
+    0x80: "cp932",
+    0xA0: "utf-8",
+}
+
+SIXBIT_CHARMAP: Final[str] = "0123456789:ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+# type id -> (type name, struct format char, element count), count -1 means length prefixed
+KBIN_FORMATS: Final[Dict[int, Tuple[str, str, int]]] = {
+    2: ("s8", "b", 1),
+    3: ("u8", "B", 1),
+    4: ("s16", "h", 1),
+    5: ("u16", "H", 1),
+    6: ("s32", "i", 1),
+    7: ("u32", "I", 1),
+    8: ("s64", "q", 1),
+    9: ("u64", "Q", 1),
+    10: ("bin", "B", -1),
+    11: ("str", "B", -1),
+    12: ("ip4", "I", 1),
+    13: ("time", "I", 1),
+    14: ("float", "f", 1),
+    15: ("double", "d", 1),
+    16: ("2s8", "b", 2),
+    17: ("2u8", "B", 2),
+    18: ("2s16", "h", 2),
+    19: ("2u16", "H", 2),
+    20: ("2s32", "i", 2),
+    21: ("2u32", "I", 2),
+    22: ("2s64", "q", 2),
+    23: ("2u64", "Q", 2),
+    24: ("2f", "f", 2),
+    25: ("2d", "d", 2),
+    26: ("3s8", "b", 3),
+    27: ("3u8", "B", 3),
+    28: ("3s16", "h", 3),
+    29: ("3u16", "H", 3),
+    30: ("3s32", "i", 3),
+    31: ("3u32", "I", 3),
+    32: ("3s64", "q", 3),
+    33: ("3u64", "Q", 3),
+    34: ("3f", "f", 3),
+    35: ("3d", "d", 3),
+    36: ("4s8", "b", 4),
+    37: ("4u8", "B", 4),
+    38: ("4s16", "h", 4),
+    39: ("4u16", "H", 4),
+    40: ("4s32", "i", 4),
+    41: ("4u32", "I", 4),
+    42: ("4s64", "q", 4),
+    43: ("4u64", "Q", 4),
+    44: ("4f", "f", 4),
+    45: ("4d", "d", 4),
+    48: ("vs8", "b", 16),
+    49: ("vu8", "B", 16),
+    50: ("vs16", "h", 8),
+    51: ("vu16", "H", 8),
+    52: ("bool", "b", 1),
+    53: ("2b", "b", 2),
+    54: ("3b", "b", 3),
+    55: ("4b", "b", 4),
+    56: ("vb", "b", 16),
+}
+
+KBIN_TYPE_IDS: Final[Dict[str, int]] = {
+    **{fmt[0]: type_id for type_id, fmt in KBIN_FORMATS.items()},
+    "binary": 10,
+    "string": 11,
+    "f": 14,
+    "d": 15,
+    "vs64": 22,
+    "vu64": 23,
+    "vd": 25,
+    "vs32": 40,
+    "vu32": 41,
+    "vf": 44,
+    "b": 52,
+}
+
+# python codec name -> encoding byte in the header
+ENCODING_VALUES: Final[Dict[str, int]] = {
+    "cp932": 0x80,
+    "shift_jis": 0x80,
+    "ascii": 0x20,
+    "iso8859-1": 0x40,
+    "latin-1": 0x40,
+    "euc_jp": 0x60,
+    "utf-8": 0xA0,
+}
+
+# attributes the XML form uses to describe the value itself, never written as kbin attributes
+META_ATTRS: Final[Tuple[str, ...]] = ("$__type", "$__count", "$__size")
+
+INT_TYPES: Final[Tuple[str, ...]] = ("s8", "u8", "s16", "u16", "s32", "u32", "s64", "u64")
+FLOAT_TYPES: Final[Tuple[str, ...]] = ("float", "double")
+
+# struct format char -> array.array typecode, where the C type has the kbin size
+ARRAY_TYPECODES: Final[Dict[str, str]] = {
+    c: c for c in "bBhHiIqQfd" if array(c).itemsize == struct.calcsize(c)
+}
+# how fromKBinXml(arrays=...) returns numeric __count values besides plain lists
+ARRAY_MODES: Final[Tuple[str, ...]] = ("array", "numpy")
+# KBinReader.select() schema value for nodes left undecoded
+LAZY: Final[str] = "lazy"
+_SWAP_ARRAYS: Final[bool] = sys.byteorder == "little"
+
+_U32 = struct.Struct(">I")
+_S32 = struct.Struct(">i")
+
+# sixbit names repeat across every document, cache them by their raw bytes
+_NAME_CACHE: Dict[bytes, str] = {}
+_NAME_CACHE_LIMIT: Final[int] = 4096
+_PACKED_NAME_CACHE: Dict[str, bytes] = {}
+_SIXBIT_VALUES: Final[Dict[str, int]] = {c: i for i, c in enumerate(SIXBIT_CHARMAP)}
+
+
+def is_typed_array(value: Any) -> bool:
+    """True for the array.array and ndarray values fromKBinXml(arrays=...) produces."""
+    return isinstance(value, array) or (numpy is not None and isinstance(value, numpy.ndarray))
+
+
+class KBinException(Exception):
+    """
+    An exception thrown when a kbin document is malformed.
+    """
+
+
+class KValueNode(MutableMapping):
+    """
+    A typed value as three slots instead of a dict: the kbin type id, the value
+    and the attributes (None when there are none). It still reads and writes like
+    the KValueG dict form ("$__type", "__value", "$name"), so code written against
+    that keeps working, while the writers pick the slots up directly.
+    """
+
+    __slots__ = ("type_id", "value", "attrs")
+
+    def __init__(self, type_name: str, value: Any, attrs: Optional[Dict[str, Any]] = None) -> None:
+        type_id = KBIN_TYPE_IDS.get(type_name)
+        if type_id is None:
+            raise ValueError(f"不支持的类型 {type_name}")
+        self.type_id: int = type_id
+        self.value: Any = value
+        self.attrs: Optional[Dict[str, Any]] = dict(attrs) if attrs else None
+
+    @property
+    def type_name(self) -> str:
+        # aliases such as "b" or "string" come back as their canonical name
+        return KBIN_FORMATS[self.type_id][0]
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "__value":
+            return self.value
+        if key == "$__type":
+            return self.type_name
+        if key[:1] == "$" and self.attrs is not None and key[1:] in self.attrs:
+            return self.attrs[key[1:]]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "__value":
+            self.value = value
+        elif key == "$__type":
+            type_id = KBIN_TYPE_IDS.get(value)
+            if type_id is None:
+                raise ValueError(f"不支持的类型 {value}")
+            self.type_id = type_id
+        elif key[:1] == "$":
+            if self.attrs is None:
+                self.attrs = {}
+            self.attrs[key[1:]] = value
+        else:
+            raise KeyError(f"{key}: a value node has no children")
+
+    def __delitem__(self, key: str) -> None:
+        if key[:1] != "$" or key == "$__type" or self.attrs is None or key[1:] not in self.attrs:
+            raise KeyError(key)
+        del self.attrs[key[1:]]
+        if not self.attrs:
+            self.attrs = None
+
+    def __iter__(self) -> Iterator[str]:
+        yield "$__type"
+        yield "__value"
+        if self.attrs is not None:
+            for key in self.attrs:
+                yield "$" + key
+
+    def __len__(self) -> int:
+        return 2 + (len(self.attrs) if self.attrs is not None else 0)
+
+    def __repr__(self) -> str:
+        return f"KValueNode({self.type_name!r}, {self.value!r}, {self.attrs!r})"
+
+
+def _format_float(value: float) -> str:
+    return f"{value:.6f}"
+
+
+def _format_ip4(value: int) -> str:
+    return ".".join(str(b) for b in value.to_bytes(4, "big"))
+
+
+def _unpack_sixbit(raw: bytes) -> str:
+    length = raw[0]
+    length_bits = length * 6
+    padding = (8 - length_bits % 8) % 8
+    bits = int.from_bytes(raw[1:], "big") >> padding
+    chars = [""] * length
+    for i in range(length - 1, -1, -1):
+        chars[i] = SIXBIT_CHARMAP[bits & 0x3F]
+        bits >>= 6
+    return "".join(chars)
+
+
+def _pack_sixbit(name: str) -> bytes:
+    packed = _PACKED_NAME_CACHE.get(name)
+    if packed is not None:
+        return packed
+
+    bits = 0
+    try:
+        for c in name:
+            bits = (bits << 6) | _SIXBIT_VALUES[c]
+    except KeyError:
+        raise KBinException(f"Node name {name!r} cannot be stored in a compressed kbin document")
+    padding = (8 - len(name) * 6 % 8) % 8
+    packed = bytes((len(name),)) + (bits << padding).to_bytes((len(name) * 6 + padding) // 8, "big")
+    if len(_PACKED_NAME_CACHE) < _NAME_CACHE_LIMIT:
+        _PACKED_NAME_CACHE[name] = packed
+    return packed
+
+
+class KBinReader:
+    """
+    Decodes a binary kbin document straight into python objects, walking the node
+    and data sections once. Two output shapes are supported:
+
+    - raw: the same shape the XML parser produces, attributes prefixed with "$",
+      values kept as text under "__value" and typed with "$__type".
+    - object: the shape toObject() produces, values converted to python types and
+      attributes stored without their "$" prefix.
+
+    find() and get() answer path queries instead, decoding only the matched nodes,
+    and select() decodes only the parts of the tree a schema names.
+    """
+
+    __slots__ = ("data", "compressed", "encoding", "node_end", "data_start")
+
+    def __init__(self, data: bytes) -> None:
+        """
+        Initialize the object.
+
+        Parameters:
+            data - Binary blob representing a kbin document.
+        """
+        if len(data) < 12 or data[0] != SIGNATURE or data[1] not in (SIG_COMPRESSED, SIG_UNCOMPRESSED):
+            raise KBinException("Not a kbin document")
+        if data[2] ^ 0xFF != data[3]:
+            raise KBinException("Corrupt encoding byte in kbin header")
+        if data[2] not in ENCODINGS:
+            raise KBinException(f"Unknown kbin encoding {data[2]:#x}")
+
+        self.data: bytes = data
+        self.compressed: bool = data[1] == SIG_COMPRESSED
+        self.encoding: str = ENCODINGS[data[2]]
+        self.node_end: int = 8 + _U32.unpack_from(data, 4)[0]
+        if self.node_end + 4 > len(data):
+            raise KBinException("Unexpected EOF in kbin node section")
+        self.data_start: int = self.node_end + 4
+
+    def _read_name(self, pos: int) -> Tuple[str, int]:
+        """
+        Read a node or attribute name from the node section.
+
+        Returns:
+            a tuple of the name and the position right after it.
+        """
+        data = self.data
+        if self.compressed:
+            end = pos + 1 + (data[pos] * 6 + 7) // 8
+            raw = bytes(data[pos:end])
+            name = _NAME_CACHE.get(raw)
+            if name is None:
+                name = _unpack_sixbit(raw)
+                if len(_NAME_CACHE) < _NAME_CACHE_LIMIT:
+                    _NAME_CACHE[raw] = name
+            return name, end
+
+        end = pos + 1 + (data[pos] & ~ARRAY_FLAG) + 1
+        return bytes(data[pos + 1 : end]).decode(self.encoding), end
+
+    def read(self, to_object: bool = False, arrays: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Decode the whole document.
+
+        Parameters:
+            to_object - Produce the toObject() shape instead of the raw XML shape.
+            arrays - With to_object, return int and float __count values as
+                     "array" (array.array) or "numpy" (a read-only ndarray viewing
+                     the document buffer) instead of lists.
+
+        Returns:
+            a dict with the root node name as its only key.
+        """
+        if arrays is not None:
+            if arrays not in ARRAY_MODES:
+                raise KBinException(f"Unknown array mode {arrays}")
+            if not to_object:
+                raise KBinException("Typed arrays need to_object")
+            if arrays == "numpy" and numpy is None:
+                raise KBinException("numpy is not installed")
+
+        # kbin packs 1 and 2 byte values into shared dwords, so three data cursors are tracked
+        cursor = [8, self.data_start, self.data_start, self.data_start]
+        return self._read_nodes(cursor, to_object, arrays, False)
+
+    def _read_nodes(self, cursor: List[int], to_object: bool, arrays: Optional[str], single: bool) -> Dict[str, Any]:
+        """
+        Decode nodes starting at cursor ([node pos, data pos, byte pos, word pos]),
+        either to the end of the document or, with single, only the node at cursor
+        and its subtree. cursor is left pointing right after what was decoded.
+        """
+        data = self.data
+        encoding = self.encoding
+        node_end = self.node_end
+        read_name = self._read_name
+        unpack_from = struct.unpack_from
+
+        pos, data_pos, byte_pos, word_pos = cursor
+
+        root: Dict[str, Any] = {}
+        # each entry is [name, container, value, repeated child names]
+        stack: List[List[Any]] = [["", root, None, None]]
+
+        while pos < node_end:
+            node_type = data[pos]
+            pos += 1
+            if node_type == 0:
+                continue
+
+            is_array = node_type & ARRAY_FLAG
+            node_type &= ~ARRAY_FLAG
+
+            if node_type == NODE_END:
+                if len(stack) == 1:
+                    continue
+                name, container, value, _ = stack.pop()
+                if value is None:
+                    if container:
+                        value = container
+                    else:
+                        value = {} if to_object else ""
+                elif not to_object:
+                    value = container
+                parent = stack[-1]
+                siblings = parent[1]
+                if name in siblings:
+                    if parent[3] is None:
+                        parent[3] = set()
+                    if name in parent[3]:
+                        siblings[name].append(value)
+                    else:
+                        parent[3].add(name)
+                        siblings[name] = [siblings[name], value]
+                else:
+                    siblings[name] = value
+                if single and len(stack) == 1:
+                    break
+                continue
+
+            if node_type == SECTION_END:
+                break
+
+            name, pos = read_name(pos)
+
+            if node_type == NODE_ATTR:
+                size = _S32.unpack_from(data, data_pos)[0]
+                attr = bytes(data[data_pos + 4 : data_pos + 4 + size - 1]).decode(encoding)
+                data_pos += 4 + ((size + 3) & ~3)
+                stack[-1][1][name if to_object else "$" + name] = attr
+                continue
+
+            if node_type == NODE_START:
+                stack.append([name, {}, None, None])
+                continue
+
+            fmt = KBIN_FORMATS.get(node_type)
+            if fmt is None:
+                raise KBinException(f"Unknown kbin node type {node_type}")
+            type_name, type_char, count = fmt
+
+            if count == -1:
+                size = _U32.unpack_from(data, data_pos)[0]
+                raw = bytes(data[data_pos + 4 : data_pos + 4 + size])
+                data_pos += 4 + ((size + 3) & ~3)
+                if type_name == "bin":
+                    value = raw
+                else:
+                    value = raw[:-1].decode(encoding).strip("\0")
+                total = size
+            elif is_array:
+                size = _U32.unpack_from(data, data_pos)[0]
+                total = size // struct.calcsize(type_char)
+                if arrays is not None and (type_name in INT_TYPES or type_name in FLOAT_TYPES):
+                    if data_pos + 4 + size > len(data):
+                        raise KBinException("Unexpected EOF in kbin data section")
+                    value = self._typed_array(arrays, type_char, data_pos + 4, total)
+                    data_pos += 4 + ((size + 3) & ~3)
+                    stack.append([name, {}, value, None])
+                    continue
+                value = unpack_from(f">{total}{type_char}", data, data_pos + 4)
+                data_pos += 4 + ((size + 3) & ~3)
+            else:
+                total = count
+                size = struct.calcsize(type_char) * count
+                if byte_pos % 4 == 0:
+                    byte_pos = data_pos
+                if word_pos % 4 == 0:
+                    word_pos = data_pos
+                if size == 1:
+                    value = unpack_from(f">{count}{type_char}", data, byte_pos)
+                    byte_pos += 1
+                elif size == 2:
+                    value = unpack_from(f">{count}{type_char}", data, word_pos)
+                    word_pos += 2
+                else:
+                    value = unpack_from(f">{count}{type_char}", data, data_pos)
+                    data_pos += (size + 3) & ~3
+                trailing = byte_pos if byte_pos > word_pos else word_pos
+                if data_pos < trailing:
+                    data_pos = (trailing + 3) & ~3
+
+            if data_pos > len(data):
+                raise KBinException("Unexpected EOF in kbin data section")
+
+            if to_object:
+                node: Dict[str, Any] = {}
+                value = self._convert_value(type_name, type_char, value, is_array or count == -1)
+            else:
+                node = {"$__type": type_name}
+                if is_array and count != -1:
+                    node["$__count"] = str(total // count)
+                text = self._format_value(type_name, type_char, value)
+                if type_name == "bin":
+                    node["$__size"] = str(total)
+                if text != "":
+                    node["__value"] = text
+                value = True
+            stack.append([name, node, value, None])
+
+        cursor[:] = (pos, data_pos, byte_pos, word_pos)
+        return root
+
+    def find(self, paths: Iterable[str], to_object: bool = True) -> Dict[str, Any]:
+        """
+        Look up nodes by path without decoding the whole document. The node stream
+        is scanned with only the data cursors advancing; a matched node (a value
+        or a whole subtree) is decoded on its own, and the scan stops as soon as
+        every path has been found.
+
+        Parameters:
+            paths - Slash separated node names from the root, e.g.
+                    "pdata/player/djname"; "pdata/player/@id" selects an attribute.
+                    Repeated nodes match their first occurrence.
+            to_object - Decode matches in the toObject() shape, else the raw XML shape.
+
+        Returns:
+            a dict of path -> decoded node, paths not in the document are left out.
+            A path may lie inside another one, both are then looked up.
+        """
+        wanted = set(paths)
+        found: Dict[str, Any] = {}
+        # nodes on the way to a wanted path, names under any other node aren't even decoded
+        route = {""}
+        for path in wanted:
+            parts = path.split("/")
+            route.update("/".join(parts[:i]) for i in range(1, len(parts)))
+        # wanted paths that other wanted paths lie under
+        nested = wanted & route
+
+        data = self.data
+        encoding = self.encoding
+        node_end = self.node_end
+        read_name = self._read_name
+
+        data_pos = self.data_start
+        byte_pos = data_pos
+        word_pos = data_pos
+
+        compressed = self.compressed
+        # path of every open node, None off the route, the root's parent being ""
+        path_stack: List[Optional[str]] = [""]
+        pos = 8
+
+        while pos < node_end and len(found) < len(wanted):
+            node_pos = pos
+            node_type = data[pos]
+            pos += 1
+            if node_type == 0:
+                continue
+
+            is_array = node_type & ARRAY_FLAG
+            node_type &= ~ARRAY_FLAG
+
+            if node_type == NODE_END:
+                if len(path_stack) > 1:
+                    path_stack.pop()
+                continue
+
+            if node_type == SECTION_END:
+                break
+
+            parent = path_stack[-1]
+            if parent is None:
+                path = None
+                pos += 1 + ((data[pos] * 6 + 7) // 8 if compressed else (data[pos] & ~ARRAY_FLAG) + 1)
+            else:
+                name, pos = read_name(pos)
+                if node_type == NODE_ATTR:
+                    path = parent + "/@" + name
+                else:
+                    path = parent + "/" + name if parent else name
+
+            if node_type == NODE_ATTR:
+                size = _S32.unpack_from(data, data_pos)[0]
+                if path in wanted and path not in found:
+                    found[path] = bytes(data[data_pos + 4 : data_pos + 4 + size - 1]).decode(encoding)
+                data_pos += 4 + ((size + 3) & ~3)
+                continue
+
+            if path in wanted and path not in found:
+                cursor = [node_pos, data_pos, byte_pos, word_pos]
+                found[path] = self._read_nodes(cursor, to_object, None, True)[name]
+                if path not in nested:
+                    pos, data_pos, byte_pos, word_pos = cursor
+                    continue
+                # the decode moved a copy of the cursors, scan on into the subtree from its start
+
+            path_stack.append(path if path in route else None)
+            if node_type == NODE_START:
+                continue
+
+            data_pos, byte_pos, word_pos = self._skip_value(node_type, is_array, data_pos, byte_pos, word_pos)
+
+        return found
+
+    def _skip_value(self, node_type: int, is_array: int, data_pos: int, byte_pos: int, word_pos: int) -> Tuple[int, int, int]:
+        """
+        Step over the value of a node without decoding it, moving the data cursors
+        exactly like read() does.
+
+        Returns:
+            the new data, byte and word positions.
+        """
+        fmt = KBIN_FORMATS.get(node_type)
+        if fmt is None:
+            raise KBinException(f"Unknown kbin node type {node_type}")
+        _, type_char, count = fmt
+
+        if count == -1 or is_array:
+            size = _U32.unpack_from(self.data, data_pos)[0]
+            data_pos += 4 + ((size + 3) & ~3)
+        else:
+            size = struct.calcsize(type_char) * count
+            if byte_pos % 4 == 0:
+                byte_pos = data_pos
+            if word_pos % 4 == 0:
+                word_pos = data_pos
+            if size == 1:
+                byte_pos += 1
+            elif size == 2:
+                word_pos += 2
+            else:
+                data_pos += (size + 3) & ~3
+            trailing = byte_pos if byte_pos > word_pos else word_pos
+            if data_pos < trailing:
+                data_pos = (trailing + 3) & ~3
+
+        if data_pos > len(self.data):
+            raise KBinException("Unexpected EOF in kbin data section")
+        return data_pos, byte_pos, word_pos
+
+    def select(self, schema: Dict[str, Any], arrays: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Decode only the nodes a schema names, in the toObject() shape. Everything
+        else is stepped over without being decoded.
+
+        Parameters:
+            schema - Mirrors the tree from the root: each key is a child node (or
+                     attribute) name, mapped to a nested schema for its children,
+                     None to decode it whole, or LAZY to leave it undecoded and put
+                     a KBinNode in its place.
+            arrays - As for read().
+
+        Returns:
+            a dict with the root node name as its only key, if the schema names it.
+        """
+        data = self.data
+        encoding = self.encoding
+        node_end = self.node_end
+        read_name = self._read_name
+
+        data_pos = self.data_start
+        byte_pos = data_pos
+        word_pos = data_pos
+
+        compressed = self.compressed
+        root: Dict[str, Any] = {}
+        # each entry is [schema, container, repeated child names], None under nodes being skipped
+        stack: List[Optional[List[Any]]] = [[schema, root, None]]
+        pos = 8
+
+        def add(frame: List[Any], name: str, value: Any):
+            siblings = frame[1]
+            if name not in siblings:
+                siblings[name] = value
+            elif frame[2] is not None and name in frame[2]:
+                siblings[name].append(value)
+            else:
+                if frame[2] is None:
+                    frame[2] = set()
+                frame[2].add(name)
+                siblings[name] = [siblings[name], value]
+
+        while pos < node_end:
+            node_pos = pos
+            node_type = data[pos]
+            pos += 1
+            if node_type == 0:
+                continue
+
+            is_array = node_type & ARRAY_FLAG
+            node_type &= ~ARRAY_FLAG
+
+            if node_type == NODE_END:
+                if len(stack) > 1:
+                    stack.pop()
+                continue
+
+            if node_type == SECTION_END:
+                break
+
+            frame = stack[-1]
+            if frame is None:
+                name = None
+                pos += 1 + ((data[pos] * 6 + 7) // 8 if compressed else (data[pos] & ~ARRAY_FLAG) + 1)
+            else:
+                name, pos = read_name(pos)
+                if name not in frame[0]:
+                    name = None
+
+            if node_type == NODE_ATTR:
+                size = _S32.unpack_from(data, data_pos)[0]
+                if name is not None:
+                    frame[1][name] = bytes(data[data_pos + 4 : data_pos + 4 + size - 1]).decode(encoding)
+                data_pos += 4 + ((size + 3) & ~3)
+                continue
+
+            if name is not None:
+                sub = frame[0][name]
+                if sub == LAZY:
+                    add(frame, name, KBinNode(self, (node_pos, data_pos, byte_pos, word_pos)))
+                elif sub is not None and node_type == NODE_START:
+                    container: Dict[str, Any] = {}
+                    add(frame, name, container)
+                    stack.append([sub, container, None])
+                    continue
+                else:
+                    cursor = [node_pos, data_pos, byte_pos, word_pos]
+                    add(frame, name, self._read_nodes(cursor, True, arrays, True)[name])
+                    pos, data_pos, byte_pos, word_pos = cursor
+                    continue
+
+            stack.append(None)
+            if node_type != NODE_START:
+                data_pos, byte_pos, word_pos = self._skip_value(node_type, is_array, data_pos, byte_pos, word_pos)
+
+        return root
+
+    def get(self, path: str, default: Any = None, to_object: bool = True) -> Any:
+        """
+        Decode the single node at path, see find().
+        """
+        return self.find((path,), to_object).get(path, default)
+
+    def _typed_array(self, mode: str, type_char: str, start: int, total: int) -> Any:
+        """
+        Read total big endian values at start with one buffer operation. Floats
+        keep their exact value, the list form rounds them like the text form does.
+        """
+        if mode == "numpy":
+            # a view, not a copy: it keeps the whole document buffer alive
+            return numpy.frombuffer(self.data, numpy.dtype(">" + type_char), total, start)
+
+        typecode = ARRAY_TYPECODES.get(type_char)
+        if typecode is None:
+            raise KBinException(f"No array typecode of {type_char} on this platform")
+        values = array(typecode)
+        values.frombytes(self.data[start : start + total * values.itemsize])
+        if _SWAP_ARRAYS:
+            values.byteswap()
+        return values
+
+    @staticmethod
+    def _format_value(type_name: str, type_char: str, value: Any) -> str:
+        """
+        Render a decoded value the same way the XML text form does.
+        """
+        if type_name == "bin":
+            return value.hex()
+        if type_name == "str":
+            return value
+        if type_name == "ip4":
+            return _format_ip4(value[0])
+        if type_char in ("f", "d"):
+            return " ".join(_format_float(x) for x in value)
+        return " ".join(str(x) for x in value)
+
+    @staticmethod
+    def _convert_value(type_name: str, type_char: str, value: Any, is_array: bool) -> Any:
+        """
+        Convert a decoded value into the same python value parseValue() yields.
+        """
+        if type_name in INT_TYPES:
+            return list(value) if is_array else value[0]
+        if type_name in FLOAT_TYPES:
+            # the text form only carries 6 decimals, keep results identical to it
+            if is_array:
+                return [float(_format_float(x)) for x in value]
+            return float(_format_float(value[0]))
+        if type_name == "bool":
+            return [bool(x) for x in value] if is_array else bool(value[0])
+        if type_name in ("bin", "str"):
+            return value
+        if type_name == "ip4":
+            return _format_ip4(value[0])
+        if type_name == "time":
+            if is_array:
+                return [datetime.fromtimestamp(x) for x in value]
+            return datetime.fromtimestamp(value[0])
+
+        return {
+            "type": type_name,
+            "value": KBinReader._format_value(type_name, type_char, value),
+        }
+
+
+class KBinNode:
+    """
+    A node that KBinReader.select() located but left undecoded. It keeps the
+    document alive, decode() reads just this node and its subtree.
+    """
+
+    __slots__ = ("reader", "cursor")
+
+    def __init__(self, reader: KBinReader, cursor: Tuple[int, int, int, int]) -> None:
+        self.reader = reader
+        self.cursor = cursor
+
+    def decode(self, to_object: bool = True, arrays: Optional[str] = None) -> Any:
+        decoded = self.reader._read_nodes(list(self.cursor), to_object, arrays, True)
+        return next(iter(decoded.values()))
+
+class KBinWriter:
+    """
+    Encodes a Serializable tree (KValueNode or KValueG values and plain dicts)
+    straight into a binary kbin document, without the intermediate XML text. Output is
+    byte-identical to serializing the tree to XML and encoding that: children are
+    written in descending name order and attributes in ascending name order.
+    """
+
+    def __init__(self, encoding: str = "UTF-8", compressed: bool = True) -> None:
+        """
+        Initialize the object.
+
+        Parameters:
+            encoding - Encoding used for strings, attributes and uncompressed names.
+            compressed - Store node names as sixbit.
+        """
+        try:
+            codec = codecs.lookup(encoding).name
+        except LookupError:
+            codec = encoding
+        if codec not in ENCODING_VALUES:
+            raise KBinException(f"Unsupported kbin encoding {encoding}")
+
+        self.encoding: str = codec
+        self.compressed: bool = compressed
+        self.nodes: bytearray = bytearray()
+        self.data: bytearray = bytearray()
+        self.byte_pos: int = 0
+        self.word_pos: int = 0
+
+    def write(self, top_name: str, obj: Any) -> bytes:
+        """
+        Encode a tree under the given root node name.
+
+        Returns:
+            the kbin document.
+        """
+        self.nodes = bytearray()
+        self.data = bytearray()
+        self.byte_pos = 0
+        self.word_pos = 0
+
+        self._write_node(top_name, obj)
+        self.nodes.append(SECTION_END | ARRAY_FLAG)
+        self.nodes.extend(b"\0" * (-len(self.nodes) % 4))
+
+        encoding_byte = ENCODING_VALUES[self.encoding]
+        header = bytes((
+            SIGNATURE,
+            SIG_COMPRESSED if self.compressed else SIG_UNCOMPRESSED,
+            encoding_byte,
+            encoding_byte ^ 0xFF,
+        ))
+        return b"".join((
+            header,
+            _U32.pack(len(self.nodes)),
+            self.nodes,
+            _U32.pack(len(self.data)),
+            self.data,
+        ))
+
+    def _write_name(self, name: str) -> None:
+        if self.compressed:
+            self.nodes.extend(_pack_sixbit(name))
+        else:
+            raw = name.encode(self.encoding)
+            self.nodes.append((len(raw) - 1) | ARRAY_FLAG)
+            self.nodes.extend(raw)
+
+    def _append_sized(self, raw: bytes) -> None:
+        data = self.data
+        data.extend(_U32.pack(len(raw)))
+        data.extend(raw)
+        data.extend(b"\0" * (-len(data) % 4))
+
+    def _append_aligned(self, packed: bytes) -> None:
+        """
+        Append a fixed size value, packing 1 and 2 byte values into shared dwords.
+        """
+        data = self.data
+        if self.byte_pos % 4 == 0:
+            self.byte_pos = len(data)
+        if self.word_pos % 4 == 0:
+            self.word_pos = len(data)
+
+        size = len(packed)
+        if size == 1:
+            if self.byte_pos % 4 == 0:
+                data.extend(b"\0\0\0\0")
+            data[self.byte_pos] = packed[0]
+            self.byte_pos += 1
+        elif size == 2:
+            if self.word_pos % 4 == 0:
+                data.extend(b"\0\0\0\0")
+            data[self.word_pos : self.word_pos + 2] = packed
+            self.word_pos += 2
+        else:
+            data.extend(packed)
+            data.extend(b"\0" * (-len(data) % 4))
+
+    def _write_node(self, name: str, obj: Any) -> None:
+        nodes = self.nodes
+
+        if type(obj) is KValueNode:
+            if obj.value is None:
+                return
+            self._write_typed(name, obj.type_id, obj.value, False)
+            attrs = obj.attrs
+            if attrs is not None:
+                for key in sorted(k for k in attrs if attrs[k] is not None):
+                    self._append_sized(str(attrs[key]).encode(self.encoding) + b"\0")
+                    nodes.append(NODE_ATTR)
+                    self._write_name(key)
+            nodes.append(NODE_END | ARRAY_FLAG)
+            return
+
+        # Mapping rather than dict: a KValueNode from a second copy of this module
+        # (imported as utils.kbin besides kbin) still writes correctly, just slower
+        if not isinstance(obj, Mapping):
+            # empty nodes come back from the decoder as ""
+            nodes.append(NODE_START)
+            self._write_name(name)
+            nodes.append(NODE_END | ARRAY_FLAG)
+            return
+
+        # empty strings come back from the decoder with a type but no value
+        is_value = "__value" in obj or "$__type" in obj
+        if is_value:
+            value = obj.get("__value", "")
+            if value is None:
+                return
+            type_name = obj.get("$__type")
+            if type_name is None:
+                raise ValueError(f"{name}中的值没有类型")
+            self._write_value(name, type_name, value, "$__count" in obj)
+        else:
+            nodes.append(NODE_START)
+            self._write_name(name)
+
+        attr_names = sorted(k for k in obj if k[:1] == "$" and k not in META_ATTRS and obj[k] is not None)
+        for key in attr_names:
+            self._append_sized(str(obj[key]).encode(self.encoding) + b"\0")
+            nodes.append(NODE_ATTR)
+            self._write_name(key[1:])
+
+        if not is_value:
+            for key in sorted((k for k in obj if k[:1] != "$"), reverse=True):
+                child = obj[key]
+                if isinstance(child, list):
+                    for item in child:
+                        self._write_node(key, item)
+                else:
+                    self._write_node(key, child)
+
+        nodes.append(NODE_END | ARRAY_FLAG)
+
+    def _write_value(self, name: str, type_name: str, value: Any, has_count: bool) -> None:
+        type_id = KBIN_TYPE_IDS.get(type_name)
+        if type_id is None:
+            raise ValueError(f"不支持的类型 {type_name}")
+        self._write_typed(name, type_id, value, has_count)
+
+    def _write_typed(self, name: str, type_id: int, value: Any, has_count: bool) -> None:
+        canonical, type_char, count = KBIN_FORMATS[type_id]
+
+        if count == -1:
+            if canonical == "bin":
+                if isinstance(value, str):
+                    raw = bytes.fromhex(value)
+                elif isinstance(value, (bytes, bytearray, memoryview)):
+                    raw = bytes(value)
+                else:
+                    raise TypeError("binary值必须是bytes或bytearray类型")
+            else:
+                raw = str(value).encode(self.encoding) + b"\0"
+            self.nodes.append(type_id)
+            self._write_name(name)
+            self._append_sized(raw)
+            return
+
+        if is_typed_array(value):
+            is_array = True
+            packed = self._pack_typed_array(type_char, value)
+        else:
+            is_array = has_count or isinstance(value, list)
+            items = self._to_items(canonical, value)
+            packed = struct.pack(f">{len(items)}{type_char}", *items)
+
+        if is_array:
+            self.nodes.append(type_id | ARRAY_FLAG)
+            self._write_name(name)
+            self._append_sized(packed)
+        else:
+            self.nodes.append(type_id)
+            self._write_name(name)
+            self._append_aligned(packed)
+
+    @staticmethod
+    def _pack_typed_array(type_char: str, value: Any) -> bytes:
+        """
+        Pack an array.array or ndarray in one buffer operation, converting it to
+        the node's type first when its element type differs.
+        """
+        if isinstance(value, array):
+            typecode = ARRAY_TYPECODES.get(type_char)
+            if typecode is None:
+                return struct.pack(f">{len(value)}{type_char}", *value)
+            # array(typecode, value) copies, so the caller's array is left alone
+            values = array(typecode, value)
+            if _SWAP_ARRAYS:
+                values.byteswap()
+            return values.tobytes()
+
+        return numpy.ascontiguousarray(value, numpy.dtype(">" + type_char)).ravel().tobytes()
+
+    @staticmethod
+    def _to_items(type_name: str, value: Any) -> List[Any]:
+        """
+        Flatten a python value (or its space separated text form) into struct items.
+        """
+        if isinstance(value, (list, tuple)):
+            values = value
+        elif isinstance(value, str):
+            values = value.split()
+        else:
+            values = [value]
+
+        if type_name == "bool":
+            return [int(v) != 0 if isinstance(v, str) else bool(v) for v in values]
+        if type_name == "ip4":
+            return [int.from_bytes(bytes(int(b) for b in v.split(".")), "big") if isinstance(v, str) else int(v) for v in values]
+        if type_name == "time":
+            return [int(v.timestamp()) if isinstance(v, datetime) else int(v) for v in values]
+        if type_name in FLOAT_TYPES or type_name[-1:] in ("f", "d"):
+            return [float(v) for v in values]
+        return [int(v) for v in values]
+
+
+def encode_kbin(top_name: str, obj: Any, encoding: str = "UTF-8", compressed: bool = True) -> bytes:
+    """
+    Given a Serializable tree, return it encoded as a kbin document.
+
+    Parameters:
+        top_name - Name of the root node.
+        obj - Tree of KValueNode or KValueG values and plain dicts.
+        encoding - Encoding used for strings and attributes.
+        compressed - Store node names as sixbit.
+    """
+    return KBinWriter(encoding, compressed).write(top_name, obj)
+
+
+def decode_kbin(data: bytes, to_object: bool = False, arrays: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Given a kbin document, return its decoded tree.
+
+    Parameters:
+        data - Binary kbin document.
+        to_object - Produce the toObject() shape instead of the raw XML shape.
+        arrays - "array" or "numpy" to get numeric __count values as typed arrays.
+    """
+    return KBinReader(data).read(to_object, arrays)
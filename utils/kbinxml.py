@@ -1,14 +1,14 @@
 import json
 import re
-from typing import Any, Dict, List, Union, Optional
+from typing import Any, Callable, Dict, List, Union, Optional
 from datetime import datetime
 import binascii
 import xml.etree.ElementTree as ET
 from xml.sax.saxutils import escape, quoteattr
-import kbinxml
 
 
 from kxml_value import Serializable, KValueG, v
+from kbin import KBinReader, KValueNode, decode_kbin, encode_kbin, is_typed_array
 
 class XMLParser:
     def __init__(self, config=None):
@@ -37,32 +37,53 @@ class XMLParser:
         except Exception as e:
             raise Exception(f"XML解析错误: {str(e)}")
 
+def _parse_int(value: str, is_array: bool) -> Any:
+    if is_array:
+        return [int(v) for v in value.split()]
+    return int(value)
+
+def _parse_float(value: str, is_array: bool) -> Any:
+    if is_array:
+        return [float(v) for v in value.split()]
+    return float(value)
+
+def _parse_bool(value: str, is_array: bool) -> Any:
+    return bool(int(value))
+
+def _parse_bin(value: str, is_array: bool) -> Any:
+    return binascii.unhexlify(value)
+
+def _parse_str(value: str, is_array: bool) -> Any:
+    return value
+
+def _parse_time(value: str, is_array: bool) -> Any:
+    return datetime.fromtimestamp(int(value))
+
+# one lookup per leaf instead of a chain of list membership tests
+VALUE_PARSERS: Dict[str, Callable[[str, bool], Any]] = {
+    **dict.fromkeys(["s8", "u8", "s16", "u16", "s32", "u32", "s64", "u64"], _parse_int),
+    **dict.fromkeys(["float", "double"], _parse_float),
+    **dict.fromkeys(["b", "bool"], _parse_bool),
+    **dict.fromkeys(["bin", "binary"], _parse_bin),
+    **dict.fromkeys(["ip4", "str", "string"], _parse_str),
+    "time": _parse_time,
+}
+
+def _node_type(node: Dict[str, Any]) -> Optional[str]:
+    # parser output keeps the attribute prefix ("$__type"), stripped trees don't
+    node_type = node.get("$__type")
+    if node_type is None:
+        node_type = node.get("__type")
+    return node_type
+
 def parseValue(node: Dict[str, Any]) -> Any:
-    is_array = "__count" in node
-    node_type = node.get("__type")
+    is_array = "$__count" in node or "__count" in node
+    node_type = _node_type(node)
     node_value = node.get("__value", "")
 
-    if node_type in ["s8", "u8", "s16", "u16", "s32", "u32", "s64", "u64"]:
-        if is_array:
-            return [int(v) for v in node_value.split()]
-        return int(node_value)
-
-    if node_type in ["float", "double"]:
-        if is_array:
-            return [float(v) for v in node_value.split()]
-        return float(node_value)
-
-    if node_type in ["b", "bool"]:
-        return bool(int(node_value))
-
-    if node_type in ["bin", "binary"]:
-        return binascii.unhexlify(node_value)
-
-    if node_type in ["ip4", "str", "string"]:
-        return node_value
-
-    if node_type == "time":
-        return datetime.fromtimestamp(int(node_value))
+    parser = VALUE_PARSERS.get(node_type)
+    if parser is not None:
+        return parser(node_value, is_array)
 
     return {
         "type": node_type,
@@ -77,44 +98,126 @@ def toObject(node: Union[Dict[str, Any], List[Any], str]) -> Any:
     if isinstance(node, str):
         return {}
 
-    if "__type" in node:
+    if "$__type" in node or "__type" in node:
         return parseValue(node)
 
     obj = {}
 
     for key, value in node.items():
-        if key == "?xml":
-            continue
-
-        if key.startswith("$"):
+        if key[:1] == "$":
             obj[key[1:]] = value
-            continue
-
-        obj[key] = toObject(value)
+        elif key != "?xml":
+            obj[key] = toObject(value)
 
     return obj
 
-def fromKBinXml(kbinxml_data: bytes, dump_xml: bool = False) -> Dict[str, Any]:
-    custom_parser = XMLParser({
-        "ignoreAttributes": False,
-        "parseAttributeValue": False,
-        "attributeNamePrefix": "$",
-        "removeNSPrefix": True,
-        "textNodeName": "__value",
-        "numberParseOptions": {
-            "hex": False,
-            "leadingZeros": False,
-            "eNotation": False,
-            "skipLike": r".*"
-        }
-    })
-    
-    xml_string = kbinxml.decode(kbinxml_data)
-    
+Converter = Callable[[Any], Any]
+
+def compileConverter(sample: Any) -> Converter:
+    """
+    Build a toObject specialised to the shape of sample: key classification and type
+    lookups happen once here instead of for every node of every document. A node
+    that doesn't match the compiled shape (other keys, another type, a single node
+    where a list was seen or the reverse) falls back to the generic toObject for
+    that subtree.
+    """
+    if isinstance(sample, list):
+        item = compileConverter(sample[0]) if sample else toObject
+
+        def convert_list(node: Any) -> Any:
+            if type(node) is not list:
+                return toObject(node)
+            return [item(v) for v in node]
+        return convert_list
+
+    if isinstance(sample, str):
+        return toObject
+
+    if "$__type" in sample or "__type" in sample:
+        node_type = _node_type(sample)
+        parser = VALUE_PARSERS.get(node_type)
+        if parser is None:
+            return toObject
+        prefix = "$" if "$__type" in sample else ""
+        type_key = prefix + "__type"
+        count_key = prefix + "__count"
+        is_array = count_key in sample
+
+        def convert_value(node: Any) -> Any:
+            if type(node) is not dict or node.get(type_key) != node_type or (count_key in node) != is_array:
+                return toObject(node)
+            return parser(node.get("__value", ""), is_array)
+        return convert_value
+
+    keys = frozenset(sample)
+    # (source key, output key, converter), attributes are copied as they are
+    fields = [
+        (key, key[1:], None) if key[:1] == "$" else (key, key, compileConverter(value))
+        for key, value in sample.items() if key != "?xml"
+    ]
+
+    def convert_node(node: Any) -> Any:
+        if type(node) is not dict or node.keys() != keys:
+            return toObject(node)
+        obj = {}
+        for key, name, child in fields:
+            obj[name] = node[key] if child is None else child(node[key])
+        return obj
+    return convert_node
+
+_converters: Dict[str, Converter] = {}
+_MAX_CONVERTERS = 1024
+
+def toObjectCached(shape_key: str, node: Any) -> Any:
+    """
+    toObject through a converter compiled from the first document seen for
+    shape_key, e.g. an eacnet "module.method". Documents of one kind share a shape,
+    so later calls skip the generic walk.
+    """
+    converter = _converters.get(shape_key)
+    if converter is None:
+        if len(_converters) >= _MAX_CONVERTERS:
+            _converters.clear()
+        converter = _converters[shape_key] = compileConverter(node)
+    return converter(node)
+
+def fromKBinXml(kbinxml_data: bytes, dump_xml: bool = False, to_object: bool = False,
+                arrays: Optional[str] = None) -> Dict[str, Any]:
+    # 直接解码二进制kbin, 不再经过XML文本
+    # arrays="array"/"numpy" 时数值数组返回array.array或ndarray, 只能和to_object一起用
     if dump_xml:
-        print(xml_string)
-        
-    return custom_parser.parse(xml_string)
+        # 调试输出从原始树生成, 原始树的值本来就是XML文本
+        reader = KBinReader(kbinxml_data)
+        tree = reader.read(False)
+        (top_name, node), = tree.items()
+        print(f'<?xml version="1.0" encoding="{reader.encoding}"?>{serializeRaw(node, top_name)}')
+        if not to_object:
+            return tree
+
+    return decode_kbin(kbinxml_data, to_object, arrays)
+
+def serializeRaw(node: Any, name: str, line_prefix: str = "") -> str:
+    # fromKBinXml原始树 -> XML, 值和属性已经是文本, 只需要转义
+    if not isinstance(node, dict):
+        return f"{line_prefix}<{name}>{escape(node or '')}</{name}>\n"
+
+    attrs = [(k[1:], v) for k, v in node.items() if k.startswith("$")]
+    attrs.sort(key=lambda x: x[0], reverse=True)
+    output = f"{line_prefix}<{name}" + "".join(f' {k}={quoteattr(str(v))}' for k, v in attrs) + ">"
+
+    if "__value" in node:
+        return output + escape(node["__value"]) + f"</{name}>\n"
+
+    elements = [(k, v) for k, v in node.items() if not k.startswith("$")]
+    elements.sort(key=lambda x: x[0], reverse=True)
+    if elements:
+        output += "\n"
+        for elem_name, elem_value in elements:
+            for item in (elem_value if isinstance(elem_value, list) else [elem_value]):
+                output += serializeRaw(item, elem_name, line_prefix + "  ")
+        output += line_prefix
+
+    return output + f"</{name}>\n"
 
 def serializeValue(value: Any, type_name: str) -> str:
     if type_name in ["s8", "u8", "s16", "u16", "s32", "u32", "s64", "u64", "float", "double"]:
@@ -143,7 +246,35 @@ def serializeValue(value: Any, type_name: str) -> str:
 
     raise ValueError(f"不支持的类型 {type_name}")
 
+def serializeValueNode(node: KValueNode, name: str, line_prefix: str = "") -> str:
+    # KValueNode的快速路径, 属性直接从slots取, 不用扫描dict
+    value = node.value
+    if value is None:
+        return ""
+    if is_typed_array(value):
+        value = value.tolist()
+
+    type_name = node.type_name
+    attrs = [("__type", type_name)]
+    if isinstance(value, list):
+        attrs.append(("__count", len(value)))
+    elif isinstance(value, (bytes, bytearray)):
+        attrs.append(("__size", len(value)))
+    if node.attrs is not None:
+        attrs.extend((k, v) for k, v in node.attrs.items() if v is not None)
+    attrs.sort(key=lambda x: x[0], reverse=True)
+
+    values = value if isinstance(value, list) else [value]
+    return (
+        f"{line_prefix}<{name}"
+        + "".join(f' {attr_name}={quoteattr(str(attr_value))}' for attr_name, attr_value in attrs)
+        + ">" + " ".join(serializeValue(v, type_name) for v in values) + f"</{name}>\n"
+    )
+
 def serializeObject(obj: Dict[str, Any], name: str, line_prefix: str = "") -> str:
+    if type(obj) is KValueNode:
+        return serializeValueNode(obj, name, line_prefix)
+
     output = f"{line_prefix}<{name}"
 
     entries = list(obj.items())
@@ -151,6 +282,9 @@ def serializeObject(obj: Dict[str, Any], name: str, line_prefix: str = "") -> st
 
     value_entry = next(((k, v) for k, v in entries if k == "__value"), None)
 
+    if value_entry and is_typed_array(value_entry[1]):
+        value_entry = ("__value", value_entry[1].tolist())
+
     if value_entry and isinstance(value_entry[1], list):
         attrs.append(("__count", len(value_entry[1])))
 
@@ -176,7 +310,7 @@ def serializeObject(obj: Dict[str, Any], name: str, line_prefix: str = "") -> st
             raise ValueError(f"{name}中的值没有类型")
 
         values = value_entry[1] if isinstance(value_entry[1], list) else [value_entry[1]]
-        output += " ".join(serializeObject(v, type_attr[1]) for v in values)
+        output += " ".join(serializeValue(v, type_attr[1]) for v in values)
     else:
         elements = [(k, v) for k, v in entries if not k.startswith("$")]
         elements.sort(key=lambda x: x[0], reverse=True)
@@ -198,9 +332,8 @@ def serializeObject(obj: Dict[str, Any], name: str, line_prefix: str = "") -> st
 
 def toKBinXml(top_name: str, obj: Serializable, encoding: str = "UTF-8", 
               dump_xml: bool = False) -> bytes:
-    xml_str = f'<?xml version="1.0" encoding="{encoding}"?>{serializeObject(obj, top_name)}'
-
+    # 直接从对象树写出kbin, XML只在调试时生成
     if dump_xml:
-        print(xml_str)
+        print(f'<?xml version="1.0" encoding="{encoding}"?>{serializeObject(obj, top_name)}')
 
-    return kbinxml.encode(xml_str)
\ No newline at end of file
+    return encode_kbin(top_name, obj, encoding)
\ No newline at end of file
@@ -1,5 +1,7 @@
 from typing import Dict, List, Union, Any, TypeVar, Generic, Callable, Optional
 from datetime import datetime
+# imported bare like kbin does, so both see the same class
+from kbin import KValueNode
 
 VALUE_TYPES = [
     's8', 'u8', 's16', 'u16', 's32', 'u32', 's64', 'u64',
@@ -80,7 +82,7 @@ class KTime(KValueG):
     def __init__(self, value: Union[datetime, int, List[Union[datetime, int]]], attrs: Optional[Dict[str, Any]] = None):
         super().__init__('time', value, attrs)
 
-KValue = Union[KS8, KU8, KS16, KU16, KS32, KU32, KS64, KU64, KFloat, KDouble, KBoolean, KBinary, KString, KIPv4, KTime]
+KValue = Union[KValueNode, KS8, KU8, KS16, KU16, KS32, KU32, KS64, KU64, KFloat, KDouble, KBoolean, KBinary, KString, KIPv4, KTime]
 
 #to-do
 '''
@@ -97,9 +99,9 @@ Serializable = Union[
 ]
 
 def vg(type_name: str):
-    def creator(value: Any, attrs: Optional[Dict[str, Any]] = None) -> KValueG:
-        result = KValueG(type_name, value, attrs)
-        return result
+    # slotted KValueNode, far smaller than a KValueG dict and read the same way
+    def creator(value: Any, attrs: Optional[Dict[str, Any]] = None) -> KValueNode:
+        return KValueNode(type_name, value, attrs)
     return creator
 
 class V:
@@ -2,8 +2,7 @@
 
 import ctypes
 import os
-from collections import defaultdict
-from typing import Generator, List, MutableMapping, Optional, Set, Tuple
+from typing import Dict, Generator, Optional, Tuple, Union
 from typing_extensions import Final
 
 
@@ -46,6 +45,10 @@ class Lz77Decompress:
     variant to the Lz77 found in firebeat executables and BIOS. This is used for
     over-the-wire compression of XML data, as well as compression inside a decent
     amount of file formats found in various Konami games.
+
+    Output is written straight into a flat buffer and backrefs are copied out of the
+    already written output, so no ring buffer has to be maintained. Positions before
+    the start of the output read as zero, just like a freshly cleared ring.
     """
 
     RING_LENGTH: Final[int] = 0x1000
@@ -53,177 +56,165 @@ class Lz77Decompress:
     FLAG_COPY: Final[int] = 1
     FLAG_BACKREF: Final[int] = 0
 
-    def __init__(self, data: bytes, backref: Optional[int] = None) -> None:
+    def __init__(self, data: bytes, backref: Optional[int] = None, limit: Optional[int] = None) -> None:
         """
         Initialize the object.
 
         Parameters:
             data - Binary blob representing the data to be decompressed.
+            limit - Optional cap on the decompressed size, exceeding it raises.
         """
-        self.eof: bool = False
         self.data: bytes = data
-        self.read_pos: int = 0
-        self.left: int = len(self.data)
-        self.flags: int = 1
-        self.write_pos: int = 0
-        self.pending_copy_amount: int = 0
-        self.pending_copy_pos: int = 0
-        self.pending_copy_max: int = 0
         self.ringlength: int = backref or self.RING_LENGTH
-        self.ring: bytes = b"\x00" * self.ringlength
+        self.limit: Optional[int] = limit
 
-    def _ring_read(self, copy_pos: int, copy_len: int) -> Generator[bytes, None, None]:
+    def decompress(self) -> bytes:
         """
-        Read the next bytes from the backref ring at the current copy position.
+        Decompress the whole stream.
 
         Returns:
-            a generator which yields bytes.
+            Raw binary data.
         """
-        while copy_len > 0:
-            if copy_pos + copy_len > self.ringlength:
-                # Copy first chunk, let subsequent loop handle the next chunks
-                amount = self.ringlength - copy_pos
-            else:
-                # Copy the whole thing out, we have enough space to do so
-                amount = copy_len
+        return bytes(self._decompress_grown())
 
-            ret = self.ring[copy_pos : (copy_pos + amount)]
-            self._ring_write(ret)
-            yield ret
-
-            copy_pos = (copy_pos + amount) % self.ringlength
-            copy_len -= amount
+    def decompress_view(self) -> memoryview:
+        """
+        Decompress the whole stream without copying the result out of the
+        output buffer.
 
-    def _ring_write(self, bytedata: bytes) -> None:
+        Returns:
+            A memoryview over the raw binary data.
         """
-        Write bytes into the backref ring.
+        return memoryview(self._decompress_grown())
+
+    def _decompress_grown(self) -> bytearray:
+        # Grown on demand, start with a typical ratio for kbin payloads.
+        size = len(self.data) * 4 + 64
+        if self.limit is not None:
+            size = min(size, self.limit)
+        out = bytearray(size)
+        length = self._decompress(out, True)
+        del out[length:]
+        return out
+
+    def decompress_into(self, buffer: Union[bytearray, memoryview]) -> int:
+        """
+        Decompress the whole stream into a caller supplied buffer, starting at
+        offset 0. The buffer is never resized.
 
         Parameters:
-            byte - A byte to be written at the current write offset
-        """
-        while True:
-            amount = len(bytedata)
-            if amount == 0:
-                return
-            if amount > (self.ringlength - self.write_pos):
-                amount = self.ringlength - self.write_pos
+            buffer - A writable buffer large enough to hold the output.
 
-            self.ring = self.ring[: self.write_pos] + bytedata[:amount] + self.ring[(self.write_pos + amount) :]
-            bytedata = bytedata[amount:]
-            self.write_pos = (self.write_pos + amount) % self.ringlength
+        Returns:
+            The number of bytes written.
+        """
+        return self._decompress(buffer, False)
 
     def decompress_bytes(self) -> Generator[bytes, None, None]:
         """
-        Yield the next byte from the decompressed output. If we are
-        in a backref copy, read the next byte from the backref. If
-        we aren't, read the next flag to see if we should decode
-        a byte directly or if we should start another backref read.
-        If we don't have any flags, exit reporting EOF (None). If
-        we hit the end of the stream, stop yielding to signify EOF.
-        In all cases, whatever byte we read should be added back to
-        the backref buffer.
+        Compatibility wrapper yielding the decompressed output as a single chunk.
 
         Returns:
             a generator that yields bytes.
         """
-        while not self.eof:
-            if self.pending_copy_amount > 0:
-                # We had a backref that would have copied more data than we had available
-                # in the ringbuffer (because every read, even a backref, adds to the
-                # ringbuffer). So, since we read that last time and wrote it to the backbuffer
-                # we are safe to read again.
-                amount = min(self.pending_copy_amount, self.pending_copy_max)
-                yield from self._ring_read(self.pending_copy_pos, amount)
-
-                # We read this many bytes and are about to write them to the ringbuffer,
-                # so bookkeep that.
-                self.pending_copy_amount -= amount
-                self.pending_copy_max = amount
-            else:
-                if self.flags == 1:
-                    # Load the next byte for processing
-                    if self.left == 0:
-                        # We have nothing left to read, so skip the
-                        # ringbuffer write below and exit early.
-                        return
-                    else:
-                        self.flags = 0x100 | self.data[self.read_pos]
-                        self.read_pos += 1
-                        self.left -= 1
-
-                # Shift the lowest bit out to be retrieved as a flag
-                flag = self.flags & 1
-                self.flags >>= 1
-
-                if flag == self.FLAG_COPY:
-                    # Figure out how much to pull at once
-                    amount = 1
-                    while self.flags != 1 and (self.flags & 1) == self.FLAG_COPY:
-                        # We would do a copy next time, so pop that flag and just add to our read amount
-                        self.flags >>= 1
-                        amount += 1
-
-                    # Grab chunk right out of the data source
-                    b = self.data[self.read_pos : (self.read_pos + amount)]
-                    self._ring_write(b)
-                    yield b
-
-                    self.read_pos += amount
-                    self.left -= amount
-                elif flag == self.FLAG_BACKREF:
-                    yield from self._read_backref()
+        yield self.decompress()
+
+    def _decompress(self, out: Union[bytearray, memoryview], grow: bool) -> int:
+        """
+        Run the decompression loop. For every flag bit either copy one literal byte
+        or expand a backref from the output written so far. Overlapping backrefs
+        (copy length longer than the distance) repeat the last distance bytes.
+
+        Parameters:
+            out - Output buffer, written from offset 0.
+            grow - Whether out is a bytearray that may be extended when full.
+
+        Returns:
+            The number of bytes written.
+        """
+        data = self.data
+        left = len(data)
+        ringlength = self.ringlength
+        capacity = len(out)
+        read_pos = 0
+        write_pos = 0
+
+        while read_pos < left:
+            flags = data[read_pos]
+            read_pos += 1
+
+            if flags == 0xFF and read_pos + 8 <= left:
+                # Eight literals in a row, as stored output is made of.
+                if write_pos + 8 > capacity:
+                    capacity = self._make_room(out, grow, write_pos + 8, self.limit)
+                out[write_pos : write_pos + 8] = data[read_pos : read_pos + 8]
+                read_pos += 8
+                write_pos += 8
+                continue
+
+            for _ in range(8):
+                if flags & 1 == self.FLAG_COPY:
+                    if read_pos >= left:
+                        raise LzException("Unexpected EOF during decompression!")
+                    if write_pos >= capacity:
+                        capacity = self._make_room(out, grow, write_pos + 1, self.limit)
+                    out[write_pos] = data[read_pos]
+                    read_pos += 1
+                    write_pos += 1
+                    flags >>= 1
+                    continue
+
+                if read_pos == left:
+                    # Stream ended on a flag that would start another backref.
+                    return write_pos
+                if read_pos + 1 == left:
+                    raise LzException("Unexpected EOF mid-backref")
+
+                hi = data[read_pos]
+                lo = data[read_pos + 1]
+                read_pos += 2
+
+                copy_pos = (hi << 4) | (lo >> 4)
+                if copy_pos == 0:
+                    return write_pos
+                copy_len = (lo & 0xF) + 3
+                if copy_pos >= ringlength:
+                    # Only reachable with a custom, shorter ring.
+                    copy_pos = copy_pos % ringlength or ringlength
+
+                if write_pos + copy_len > capacity:
+                    capacity = self._make_room(out, grow, write_pos + copy_len, self.limit)
+
+                src = write_pos - copy_pos
+                if src >= 0 and copy_len <= copy_pos:
+                    out[write_pos : write_pos + copy_len] = out[src : src + copy_len]
+                    write_pos += copy_len
                 else:
-                    raise Exception("Logic error!")
+                    for _ in range(copy_len):
+                        out[write_pos] = out[src] if src >= 0 else 0
+                        write_pos += 1
+                        src += 1
+                flags >>= 1
+
+        return write_pos
 
-    def _read_backref(self) -> Generator[bytes, None, None]:
+    @staticmethod
+    def _make_room(out: Union[bytearray, memoryview], grow: bool, needed: int, limit: Optional[int] = None) -> int:
         """
-        Read a backref chunk. Grab the copy length and copy position
-        from the first two bytes and then read the first byte from
-        the backref. Sets up variables such that Lz77Decompress.__read()
-        can finish copying out of the backref on subsequent calls. Should
-        only be called by Lz77Decompress.__read(). If we discover the end
-        of stream, we don't generate any bytes and instead set the eof
-        flag which terminates the main decompression loop above.
+        Make sure out can hold needed bytes, never growing it past limit.
 
         Returns:
-            a generator that yields bytes.
+            The new capacity.
         """
-        if self.left == 0:
-            self.eof = True
-            return
-        if self.left == 1:
-            raise LzException("Unexpected EOF mid-backref")
-
-        hi = self.data[self.read_pos]
-        lo = self.data[self.read_pos + 1]
-        self.read_pos += 2
-        self.left -= 2
-
-        copy_len = lo & 0xF
-        copy_pos = (hi << 4) | (lo >> 4)
-
-        if copy_pos > 0:
-            copy_len += 3
-            if copy_len > copy_pos:
-                # Remember what we have to do left, and the safe
-                # amount to copy next time (which is our length,
-                # since we are about to write that many butes to
-                # the ringbuffer right after reading them).
-                self.pending_copy_amount = copy_len - copy_pos
-                self.pending_copy_pos = self.write_pos
-                self.pending_copy_max = copy_pos
-
-                # Only copy the available bytes
-                copy_len = copy_pos
-
-            copy_pos = self.write_pos - copy_pos
-            while copy_pos < 0:
-                copy_pos += self.ringlength
-            copy_pos = copy_pos % self.ringlength
-            yield from self._ring_read(copy_pos, copy_len)
-        else:
-            self.eof = True
-            return
+        if limit is not None and needed > limit:
+            raise LzException("Decompressed data exceeds the size limit!")
+        if not grow:
+            raise LzException("Not enough room in output buffer!")
+        size = max(len(out) * 2, needed)
+        if limit is not None:
+            size = min(size, limit)
+        out.extend(bytes(size - len(out)))
+        return len(out)
 
 
 class Lz77Compress:
@@ -231,204 +222,153 @@ class Lz77Compress:
     A class that can compress arbitrary binary data using the Lz77 protocol.
     Note that this does support overlapped backtracks, so for instance the
     string "abcabcabc" will be compressed properly (see unit tests for examples).
-    Great care has been taken in optimizing this and then we further optimize
-    by using Cython to build, netting us another 40% speed-up. This is important
-    because for any given packet we are decompressing and compressing at least
-    once, and if we use a proxy to direct traffic, possibly a second time.
+
+    Matches are found with a hash chain: head maps the hash of the next three
+    bytes to the most recent position, and prev (one slot per ring entry) links
+    each position to the previous one with the same hash. How far a chain is
+    followed, and whether positions inside a match are indexed, is set by the
+    compression level.
     """
 
     RING_LENGTH: Final[int] = 0x1000
 
-    LOOSE_COMPRESS_THRESHOLD: Final[int] = 1024 * 512
-
     FLAG_COPY: Final[int] = 1
     FLAG_BACKREF: Final[int] = 0
 
-    def __init__(self, data: bytes, backref: Optional[int] = None) -> None:
+    MIN_BACKREF: Final[int] = 3
+    MAX_BACKREF: Final[int] = 18
+
+    HASH_BITS: Final[int] = 15
+
+    # level -> (longest chain followed per position, index positions inside matches)
+    LEVELS: Final[Dict[str, Tuple[int, bool]]] = {
+        "store": (0, False),
+        "fast": (4, False),
+        "best": (512, True),
+    }
+
+    def __init__(self, data: bytes, backref: Optional[int] = None, level: str = "best") -> None:
         """
         Initialize the object.
 
         Parameters:
-            data - Binary blob representing the data to be decompressed.
+            data - Binary blob representing the data to be compressed.
+            level - One of "store", "fast" or "best".
         """
+        if level not in self.LEVELS:
+            raise LzException(f"Unknown compression level {level}")
         self.data: bytes = data
-        self.read_pos: int = 0
-        self.left: int = len(self.data)
-        self.eof: bool = False
-        self.bytes_written: int = 0
         self.ringlength: int = backref or self.RING_LENGTH
-        self.locations: MutableMapping[int, Set[int]] = defaultdict(set)
-        self.starts: MutableMapping[bytes, Set[int]] = defaultdict(set)
-        self.last_start: Tuple[int, int, int] = (0, 0, 0)
+        self.level: str = level
+        self.max_chain, self.index_matches = self.LEVELS[level]
 
-        if len(data) > self.LOOSE_COMPRESS_THRESHOLD:
-            self._ring_write = self._ring_write_starts_only
-        else:
-            self._ring_write = self._ring_write_both
-
-    def _ring_write_starts_only(self, bytedata: bytes) -> None:
+    def compress(self) -> bytes:
         """
-        Write bytes into the backref ring.
+        Compress the whole stream.
 
-        Parameters:
-            byte - A byte to be written at the current write offset
+        Returns:
+            Lz77-compressed binary data.
         """
-        for byte in bytedata:
-            # Update the start locations hashmap if we're past the beginning
-            self.last_start = (self.last_start[1], self.last_start[2], byte)
-            if self.bytes_written >= 2:
-                self.starts[bytes(self.last_start)].add(self.bytes_written - 2)
+        if self.max_chain == 0:
+            return self._store()
+
+        data = self.data
+        length = len(data)
+        window = self.ringlength - 1
+        ringlength = self.ringlength
+        max_chain = self.max_chain
+        index_matches = self.index_matches
+        hash_mask = (1 << self.HASH_BITS) - 1
+
+        head = [-1] * (hash_mask + 1)
+        prev = [-1] * ringlength
+        out = bytearray()
+        pos = 0
 
-            # Keep track of the fact that we wrote this byte.
-            self.bytes_written += 1
+        while True:
+            flag_index = len(out)
+            out.append(0)
+            flags = 0
+
+            for flagpos in range(8):
+                if pos >= length:
+                    # Output the end of stream marker as the next backref.
+                    out += b"\x00\x00"
+                    out[flag_index] = flags
+                    return bytes(out)
+
+                best_len = 0
+                best_pos = 0
+                if pos + 2 < length:
+                    backref_amount = min(length - pos, self.MAX_BACKREF)
+                    h = ((data[pos] << 10) ^ (data[pos + 1] << 5) ^ data[pos + 2]) & hash_mask
+                    candidate = head[h]
+                    chain = max_chain
+                    while candidate >= 0 and pos - candidate <= window and chain > 0:
+                        # Cheap reject on the byte that would have to extend the best match.
+                        if data[candidate + best_len] == data[pos + best_len]:
+                            match = 0
+                            while match < backref_amount and data[candidate + match] == data[pos + match]:
+                                match += 1
+                            if match > best_len:
+                                best_len = match
+                                best_pos = candidate
+                                if match == backref_amount:
+                                    break
+                        next_candidate = prev[candidate % ringlength]
+                        if next_candidate >= candidate:
+                            break
+                        candidate = next_candidate
+                        chain -= 1
+
+                    prev[pos % ringlength] = head[h]
+                    head[h] = pos
+
+                if best_len < self.MIN_BACKREF:
+                    flags |= self.FLAG_COPY << flagpos
+                    out.append(data[pos])
+                    pos += 1
+                    continue
+
+                backref_pos = pos - best_pos
+                out.append((backref_pos >> 4) & 0xFF)
+                out.append(((backref_pos & 0xF) << 4) | (best_len - self.MIN_BACKREF))
+
+                end = pos + best_len
+                pos += 1
+                if index_matches:
+                    last = min(end, length - 2)
+                    while pos < last:
+                        h = ((data[pos] << 10) ^ (data[pos + 1] << 5) ^ data[pos + 2]) & hash_mask
+                        prev[pos % ringlength] = head[h]
+                        head[h] = pos
+                        pos += 1
+                pos = end
+
+            out[flag_index] = flags
 
-    def _ring_write_both(self, bytedata: bytes) -> None:
+    def compress_bytes(self) -> Generator[bytes, None, None]:
         """
-        Write bytes into the backref ring.
-
-        Parameters:
-            byte - A byte to be written at the current write offset
+        Compatibility wrapper yielding the compressed output as a single chunk.
         """
-        for byte in bytedata:
-            # Update the start locations hashmap if we're past the beginning
-            self.last_start = (self.last_start[1], self.last_start[2], byte)
-            if self.bytes_written >= 2:
-                self.starts[bytes(self.last_start)].add(self.bytes_written - 2)
-
-            # Update the rest of the location hashmaps
-            self.locations[byte].add(self.bytes_written)
+        yield self.compress()
 
-            # Keep track of the fact that we wrote this byte.
-            self.bytes_written += 1
-
-    def compress_bytes(self) -> Generator[bytes, None, None]:
+    def _store(self) -> bytes:
         """
-        Given the current stream, go through and assemble the next flag byte
-        followed by the next chunk of compressed data.
+        Emit every byte as a literal. Inflates the data by 9/8 but costs no search.
         """
-        while not self.eof:
-            if self.left == 0:
-                # Output a dummy flag and an end of stream marker.
-                self.eof = True
-                yield b"\x00\x00\x00"
-            else:
-                # Need to assemble and return the next chunk, which is a flag
-                # byte and then 8 instructions.
-                flags = 0x0
-                flagpos = -1
-                data: List[bytes] = [b""] * 8
-
-                for _ in range(8):
-                    # Track what flag we're generating data for
-                    flagpos += 1
-
-                    if self.left == 0:
-                        # Output the end of stream marker, set EOF since we've succeeded
-                        # in outputting all flags.
-                        flags |= self.FLAG_BACKREF << flagpos
-                        data[flagpos] = b"\x00\x00"
-                        self.eof = True
-                        break
-                    elif self.left < 3 or self.bytes_written < 3:
-                        # We either don't have enough data written to backref, or we
-                        # don't have enough data in the stream that could be made into
-                        # a backref.
-                        flags |= self.FLAG_COPY << flagpos
-
-                        chunk = self.data[self.read_pos : (self.read_pos + 1)]
-                        data[flagpos] = chunk
-                        self._ring_write(chunk)
-
-                        self.read_pos += 1
-                        self.left -= 1
-                        continue
-
-                    # Figure out the maximum backref we can attempt to find
-                    backref_amount = min(self.left, 18)
-
-                    # Iterate over all spots where the first byte equals, and is in range.
-                    earliest = max(0, self.bytes_written - (self.ringlength - 1))
-                    index = self.data[self.read_pos : (self.read_pos + 3)]
-                    updated_backref_locations: Set[int] = set(
-                        absolute_pos for absolute_pos in self.starts[index] if absolute_pos >= earliest
-                    )
-                    self.starts[index] = updated_backref_locations
-                    possible_backref_locations: List[int] = list(updated_backref_locations)
-
-                    # Output the data as a copy if we couldn't find a backref
-                    if not possible_backref_locations:
-                        flags |= self.FLAG_COPY << flagpos
-
-                        chunk = self.data[self.read_pos : (self.read_pos + 1)]
-                        data[flagpos] = chunk
-                        self._ring_write(chunk)
-
-                        self.read_pos += 1
-                        self.left -= 1
-                        continue
-
-                    # Now, find the longest actual backref of our possibilities. We know
-                    # we're going to write at least these three bytes, so append it to the
-                    # output buffer.
-                    start_write_size = self.bytes_written
-                    self._ring_write(index)
-                    copy_amount = 3
-                    while copy_amount < backref_amount:
-                        # First, let's see if we have any 3-wide chunks to consume.
-                        index = self.data[(self.read_pos + copy_amount) : (self.read_pos + copy_amount + 3)]
-                        locations = self.starts[index]
-                        new_backref_locations: List[int] = [
-                            absolute_pos
-                            for absolute_pos in possible_backref_locations
-                            if absolute_pos + copy_amount in locations
-                        ]
-
-                        if new_backref_locations:
-                            # Mark that we're copying an extra byte from the backref.
-                            self._ring_write(index)
-                            copy_amount += 3
-                            possible_backref_locations = new_backref_locations
-                        else:
-                            # Check our existing locations to figure out if we still have
-                            # longest prefixes of 1 or 2 left.
-                            while copy_amount < backref_amount:
-                                locations = self.locations[self.data[self.read_pos + copy_amount]]
-                                new_backref_locations = [
-                                    absolute_pos
-                                    for absolute_pos in possible_backref_locations
-                                    if absolute_pos + copy_amount in locations
-                                ]
-
-                                # If we have no longest prefixes, that means that any of the
-                                # previous prefixes are good enough.
-                                if not new_backref_locations:
-                                    break
+        data = self.data
+        length = len(data)
+        out = bytearray()
+        for pos in range(0, length - 7, 8):
+            out.append(0xFF)
+            out += data[pos : pos + 8]
 
-                                # Mark that we're copying an extra byte from the backref.
-                                self._ring_write(
-                                    self.data[(self.read_pos + copy_amount) : (self.read_pos + copy_amount + 1)]
-                                )
-                                copy_amount += 1
-                                possible_backref_locations = new_backref_locations
-
-                            # Either we looped above in the inner while, or we didn't. Either way,
-                            # we don't have any more to check since there were no more 3-long backref
-                            # locations.
-                            break
-
-                    # Now that we have a list of candidates, arbitrarily pick the
-                    # first one as our candidate and output it.
-                    absolute_pos = possible_backref_locations[0]
-                    backref_pos = start_write_size - absolute_pos
-
-                    lo = (copy_amount - 3) & 0xF | ((backref_pos & 0xF) << 4)
-                    hi = (backref_pos >> 4) & 0xFF
-                    flags |= self.FLAG_BACKREF << flagpos
-                    data[flagpos] = bytes([hi, lo])
-                    self.read_pos += copy_amount
-                    self.left -= copy_amount
-
-                yield bytes([flags]) + b"".join(data)
+        tail = length % 8
+        out.append((1 << tail) - 1)
+        out += data[length - tail :]
+        out += b"\x00\x00"
+        return bytes(out)
 
 
 class Lz77:
@@ -470,20 +410,85 @@ class Lz77:
             else:
                 raise LzException("Unknown exception in C++ code!")
         else:
-            lz = Lz77Decompress(data, backref=self.backref)
-            return b"".join(lz.decompress_bytes())
+            return Lz77Decompress(data, backref=self.backref).decompress()
 
-    def compress(self, data: bytes) -> bytes:
+    def decompress_view(self, data: Union[bytes, memoryview], limit: Optional[int] = None) -> memoryview:
+        """
+        Like decompress, but returns a memoryview over the output buffer instead
+        of copying it, and refuses to produce more than limit bytes.
+
+        Parameters:
+            data - Lz77-compressed binary data
+            limit - Optional cap on the decompressed size.
+
+        Returns:
+            A memoryview over the raw binary data.
+        """
+        if clib is not None:
+            size = len(data) * 9
+            if limit is not None:
+                size = min(size, limit)
+            outbuf = bytearray(size)
+            result = clib.decompress(
+                bytes(data), len(data), (ctypes.c_char * size).from_buffer(outbuf), size
+            )
+            if result >= 0:
+                return memoryview(outbuf)[:result]
+            elif result == -1 and size == limit:
+                raise LzException("Decompressed data exceeds the size limit!")
+            elif result == -1:
+                raise LzException("Not enough room in output buffer!")
+            elif result == -2:
+                raise LzException("Unexpected EOF during decompression!")
+            elif result == -3:
+                raise LzException("Not enough room to write output byte!")
+            else:
+                raise LzException("Unknown exception in C++ code!")
+        else:
+            return Lz77Decompress(data, backref=self.backref, limit=limit).decompress_view()
+
+    def decompress_into(self, data: bytes, buffer: Union[bytearray, memoryview]) -> int:
+        """
+        Given a binary blob, decompress it into a caller supplied writable buffer
+        starting at offset 0, without allocating an output blob.
+
+        Parameters:
+            data - Lz77-compressed binary data
+            buffer - Writable buffer large enough to hold the decompressed data.
+
+        Returns:
+            The number of bytes written to buffer.
+        """
+        if clib is not None:
+            outbuf = (ctypes.c_char * len(buffer)).from_buffer(buffer)
+            result = clib.decompress(data, len(data), outbuf, len(buffer))
+            if result >= 0:
+                return result
+            elif result == -1:
+                raise LzException("Not enough room in output buffer!")
+            elif result == -2:
+                raise LzException("Unexpected EOF during decompression!")
+            elif result == -3:
+                raise LzException("Not enough room to write output byte!")
+            else:
+                raise LzException("Unknown exception in C++ code!")
+        else:
+            return Lz77Decompress(data, backref=self.backref).decompress_into(buffer)
+
+    def compress(self, data: bytes, level: str = "best") -> bytes:
         """
         Given a binary blob, return a new binary blob representing the compressed data.
 
         Parameters:
             data - Raw binary data.
+            level - "store" skips matching entirely, "fast" follows short hash chains
+                    and "best" searches (nearly) the whole window. The C++ library
+                    has a single level and is used for anything but "store".
 
         Returns:
             L7zz-compressed binary data.
         """
-        if clib is not None:
+        if clib is not None and level != "store":
             # Given a worst case scenario where we end up copying every byte to
             # the output, compression would actually inflate the file by 9/8 size.
             # Leave enough room for a trailing EOF reference.
@@ -500,5 +505,4 @@ class Lz77:
             else:
                 raise LzException("Unknown exception in C++ code!")
         else:
-            lz = Lz77Compress(data, backref=self.backref)
-            return b"".join(lz.compress_bytes())
\ No newline at end of file
+            return Lz77Compress(data, backref=self.backref, level=level).compress()